@@ -0,0 +1,55 @@
+"""
+Micro-benchmark of the frame decoder used by ByowsRpiStation.get_data().
+
+Compares the struct based decode_frame() with the previous list/string/float round trip and
+reports the decode cost per frame in microseconds. Needs weewx to be importable, as the
+driver module is imported.
+
+Usage:
+    python3 bench/bench_decode.py [--count 100000]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+from user.byows_rpi_lora import decode_frame  # noqa: E402
+
+# Sample frame from the packet structure documentation: 24.81 C, 880.69 hPa, 66.90 %
+FRAME = bytes([1, 0, 24, 0, 81, 3, 112, 0, 69, 0, 66, 0, 90, 3, 5, 12])
+
+
+def legacy_decode(message):
+    """ The decode section of get_data() before the struct decoder. """
+    message_no_header = list(message[1:])
+    decoded_tup = []
+    for k in range(0, 11, 2):
+        tup = [message_no_header[k], message_no_header[k + 1]]
+        decoded_tup += [int.from_bytes(tup, byteorder='big', signed=True)]
+    float_value = []
+    for k2 in range(0, 5, 2):
+        tup2 = str(decoded_tup[k2]) + '.' + str(decoded_tup[k2 + 1]).rjust(2, '0')
+        float_value += [tup2]
+    res = [float(ele) for ele in float_value]
+    return res, message_no_header[12], message_no_header[13], message_no_header[14]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100000, help="frames decoded per run")
+    args = parser.parse_args()
+
+    view = memoryview(bytearray(FRAME))
+    runs = (("legacy", lambda: legacy_decode(FRAME)),
+            ("struct", lambda: decode_frame(view)))
+    for name, func in runs:
+        best = min(timeit.repeat(func, number=args.count, repeat=5))
+        print("%-8s %8.2f us/frame" % (name, best / args.count * 1e6))
+    print(decode_frame(view))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Benchmark suite of the receive and decode hot path, run against the in-process SX127x emulator.
+
+Every stage receives the same stream of Pico frames (each reading sent twice). A frame is put on
+the emulated air right before each receive, so the numbers show the software cost, not the airtime:
+    frames_per_s           - frames handled per second
+    us_per_frame           - wall time per frame in microseconds
+    spi_per_frame          - SPI transactions per frame
+    spi_bytes_per_frame    - bytes clocked over SPI per frame
+    gpio_per_frame         - GPIO writes per frame (CS toggles when the kernel chip select is not used)
+    alloc_bytes_per_frame  - peak Python memory allocated while handling one frame (tracemalloc)
+    alloc_blocks_per_frame - memory blocks still allocated after the run, per frame
+
+Stages:
+    register_read  - single SX127x register read through LoRaSpi (gpio-cs and hardware-cs)
+    configure      - ByowsRpiStation.configure_radio() applying the radio profile, with and without the register cache
+    packet_status  - packetRssi() and snr() of a received frame, with and without the register cache
+    radio_poll     - SX127x request/wait/readInto/status, polling the IRQ flags register
+    radio_irq      - the same, woken by the DIO0 edge
+    get_message    - ByowsRpiStation.get_message() in RX continuous mode
+    get_data       - ByowsRpiStation.get_data(), including pairing, decoding and unit conversion
+    decode         - decode_frame() alone
+
+Results are printed and, with --output, written as JSON so that runs can be compared over time
+with --compare. Needs weewx to be importable, as the driver module is imported.
+
+Usage:
+    python3 bench/bench_receive.py [--frames 2000] [--stage get_data] [--output run.json] [--compare old.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+from user.LoRaRF import SX127x  # noqa: E402
+from user.LoRaRF.emulator import SX127xEmulator  # noqa: E402
+from user.byows_rpi_lora import ByowsRpiStation, FRAME_STRUCT, decode_frame  # noqa: E402
+
+
+def make_frames(count):
+    """ Returns count frames as the Pico sends them: every reading twice, with headers h and h + 1. """
+    frames = []
+    for i in range(count):
+        header = (i & ~1) + 1 + (i & 1)
+        frames.append(FRAME_STRUCT.pack(header & 0xFF, 24, 81, 880, 69, 66, 90, i % 5, 12, 128))
+    return frames
+
+
+def make_radio(emulator, hardware_cs=True, irq=False):
+    LoRa = SX127x(emulator.spi(hardwareCs=hardware_cs), emulator.gpio(emulator.PIN_CS),
+                  emulator.gpio(emulator.PIN_RESET), emulator.gpio(emulator.PIN_DIO0) if irq else None)
+    LoRa.begin()
+    LoRa.setFrequency(433000000)
+    LoRa.setPayloadLength(len(FRAME_STRUCT.pack(*([0] * 10))))
+    LoRa.setCrcEnable(True)
+    return LoRa
+
+
+def register_read_stage(hardware_cs):
+    def setup(frames):
+        emulator = SX127xEmulator()
+        LoRa = make_radio(emulator, hardware_cs)
+
+        def step():
+            LoRa.readRegister(LoRa.REG_VERSION)
+        return emulator, step
+    return setup
+
+
+def configure_stage(cache):
+    def setup(frames):
+        emulator = SX127xEmulator()
+        station = ByowsRpiStation(emulator=emulator, register_cache=cache)
+        LoRa = station.LoRa
+
+        def step():
+            station.configure_radio(LoRa)
+        return emulator, step
+    return setup
+
+
+def packet_status_stage(cache):
+    def setup(frames):
+        emulator = SX127xEmulator()
+        LoRa = make_radio(emulator)
+        if cache:
+            LoRa.enableCache()
+
+        def step():
+            LoRa.packetRssi()
+            LoRa.snr()
+        return emulator, step
+    return setup
+
+
+def radio_stage(irq):
+    def setup(frames):
+        emulator = SX127xEmulator()
+        LoRa = make_radio(emulator, irq=irq)
+        buffer = bytearray(256)
+        stream = iter(frames)
+
+        def step():
+            emulator.inject(next(stream))
+            LoRa.request()
+            LoRa.wait()
+            LoRa.readInto(buffer)
+            LoRa.status()
+        return emulator, step
+    return setup
+
+
+def station_stage(method):
+    def setup(frames):
+        emulator = SX127xEmulator()
+        station = ByowsRpiStation(emulator=emulator)
+        stream = iter(frames)
+        LoRa = station.LoRa
+
+        def step():
+            emulator.inject(next(stream))
+            if method == "get_message":
+                # get_data() takes the status of every frame, which re-arms wait() in RX continuous mode
+                station.get_message(LoRa)
+                LoRa.status()
+            else:
+                station.get_data()
+        return emulator, step
+    return setup
+
+
+def decode_stage(frames):
+    frame = frames[0]
+
+    def step():
+        decode_frame(frame)
+    return None, step
+
+
+STAGES = (("register_read_gpio_cs", register_read_stage(False)),
+          ("register_read_hardware_cs", register_read_stage(True)),
+          ("configure", configure_stage(False)),
+          ("configure_cached", configure_stage(True)),
+          ("packet_status", packet_status_stage(False)),
+          ("packet_status_cached", packet_status_stage(True)),
+          ("radio_poll", radio_stage(False)),
+          ("radio_irq", radio_stage(True)),
+          ("get_message", station_stage("get_message")),
+          ("get_data", station_stage("get_data")),
+          ("decode", decode_stage))
+
+
+def run_stage(setup, frames):
+    """ Runs a stage once for timing and transaction counts and once under tracemalloc. """
+    count = len(frames)
+    emulator, step = setup(frames)
+    if emulator is not None:
+        emulator.resetCounters()
+    start = time.perf_counter()
+    for _ in range(count):
+        step()
+    elapsed = time.perf_counter() - start
+    result = {"frames": count,
+              "frames_per_s": count / elapsed,
+              "us_per_frame": elapsed / count * 1e6}
+    if emulator is not None:
+        result["spi_per_frame"] = emulator.transactions / count
+        result["spi_bytes_per_frame"] = emulator.bytesTransferred / count
+        result["gpio_per_frame"] = emulator.gpioWrites / count
+
+    emulator, step = setup(frames)
+    tracemalloc.start()
+    peak = 0
+    before = tracemalloc.take_snapshot()
+    for _ in range(count):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        step()
+        peak += tracemalloc.get_traced_memory()[1] - current
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    result["alloc_bytes_per_frame"] = peak / count
+    result["alloc_blocks_per_frame"] = retained / count
+    return result
+
+
+def compare(results, path):
+    with open(path) as f:
+        old = json.load(f)["stages"]
+    print("\nChange of us/frame against %s" % path)
+    for name, result in results.items():
+        if name in old:
+            before = old[name]["us_per_frame"]
+            print("%-26s %10.2f -> %10.2f us  (%+.1f%%)" % (name, before, result["us_per_frame"],
+                                                          (result["us_per_frame"] / before - 1) * 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=2000, help="frames handled per stage")
+    parser.add_argument("--stage", action="append", help="run only this stage, may be repeated")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames)
+    results = {}
+    print("%-26s %12s %10s %8s %8s %10s %8s" % ("stage", "frames/s", "us/frame", "spi", "gpio", "alloc B", "blocks"))
+    for name, setup in STAGES:
+        if args.stage and name not in args.stage:
+            continue
+        result = run_stage(setup, frames)
+        results[name] = result
+        print("%-26s %12.0f %10.2f %8.2f %8.2f %10.0f %8.3f" % (
+            name, result["frames_per_s"], result["us_per_frame"], result.get("spi_per_frame", 0),
+            result.get("gpio_per_frame", 0), result["alloc_bytes_per_frame"], result["alloc_blocks_per_frame"]))
+
+    if args.output:
+        report = {"timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                  "python": platform.python_version(),
+                  "platform": platform.platform(),
+                  "machine": platform.machine(),
+                  "stages": results}
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of SX127x register access through LoRaSpi.
+
+Reads the SX127x version register in a loop and reports register reads per second for:
+    legacy       - SPI device opened, configured and closed on every transfer, CS toggled through GPIO
+    persistent   - SPI device kept open, CS toggled through GPIO
+    hardware-cs  - SPI device kept open, kernel chip select frames the transfer (one ioctl per read)
+
+Must be run on the Raspberry Pi with the LoRa module connected.
+
+Usage:
+    python3 bench/bench_spi.py [--count 2000] [--bus 0] [--cs 0] [--chip 0] [--cs-pin 8] [--reset-pin 24]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin", "user"))
+
+import spidev  # noqa: E402
+from LoRaRF import SX127x, LoRaSpi, LoRaGpio  # noqa: E402
+
+
+class LegacyLoRaSpi(LoRaSpi):
+    """ LoRaSpi as it was before the device handle was kept open. """
+
+    def transfer(self, buf):
+        spi = spidev.SpiDev()
+        spi.open(self.bus, self.cs)
+        spi.lsbfirst = False
+        spi.mode = 0
+        spi.max_speed_hz = self.speed
+        ret = spi.xfer2(buf)
+        spi.close()
+        return ret
+
+
+def reads_per_second(spi, args):
+    LoRa = SX127x(spi, LoRaGpio(args.chip, args.cs_pin), LoRaGpio(args.chip, args.reset_pin))
+    version = LoRa.readRegister(LoRa.REG_VERSION)
+    if version not in (0x12, 0x22):
+        sys.exit("Unexpected SX127x version 0x%02X. Is the radio connected?" % version)
+    start = time.perf_counter()
+    for _ in range(args.count):
+        LoRa.readRegister(LoRa.REG_VERSION)
+    elapsed = time.perf_counter() - start
+    spi.close()
+    return args.count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000, help="register reads per run")
+    parser.add_argument("--bus", type=int, default=0, help="SPI bus")
+    parser.add_argument("--cs", type=int, default=0, help="SPI chip select")
+    parser.add_argument("--chip", type=int, default=0, help="GPIO chip")
+    parser.add_argument("--cs-pin", type=int, default=8, help="GPIO offset of the radio NSS pin")
+    parser.add_argument("--reset-pin", type=int, default=24, help="GPIO offset of the radio reset pin")
+    args = parser.parse_args()
+
+    runs = (("legacy", LegacyLoRaSpi(args.bus, args.cs)),
+            ("persistent", LoRaSpi(args.bus, args.cs)),
+            ("hardware-cs", LoRaSpi(args.bus, args.cs, hardwareCs=True)))
+    baseline = None
+    for name, spi in runs:
+        rate = reads_per_second(spi, args)
+        baseline = baseline or rate
+        print("%-12s %10.0f reads/s  %6.1fx" % (name, rate, rate / baseline))
+
+
+if __name__ == "__main__":
+    main()
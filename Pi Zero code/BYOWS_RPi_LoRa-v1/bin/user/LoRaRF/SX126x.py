@@ -1,7 +1,6 @@
-from .base import LoRaSpi, LoRaGpio, BaseLoRa
+from .base import LoRaSpi, LoRaGpio, LoRaIrq, BaseLoRa, RadioProfile
 from typing import Optional
 import time
-from threading import Thread
 
 class SX126x(BaseLoRa) :
     """Class for SX1261/62/68 and LLCC68 LoRa chipsets from Semtech"""
@@ -246,6 +245,9 @@ class SX126x(BaseLoRa) :
 
     # SPI and GPIO pin setting
     _busyTimeout = 5000
+    # commands which keep busy pin high for a few microseconds only, done before next SPI transfer can start
+    _BUSY_FAST_OPCODES = frozenset((0x02, 0x07, 0x08, 0x0D, 0x0E, 0x10, 0x11, 0x12, 0x13, 0x14, 0x15, 0x17,
+        0x1D, 0x1E, 0x8F, 0xC0))
     _irqTimeout = 10000
     _txState = LoRaGpio.LOW
     _rxState = LoRaGpio.LOW
@@ -264,7 +266,6 @@ class SX126x(BaseLoRa) :
     _invertIq = False
 
     # Operation properties
-    _monitoring = None
     _bufferIndex = 0
     _payloadTxRx = 32
     _statusWait = STATUS_DEFAULT
@@ -275,13 +276,17 @@ class SX126x(BaseLoRa) :
     _onTransmit = None
     _onReceive = None
 
-    def __init__(self, spi: LoRaSpi, cs: LoRaGpio, reset: LoRaGpio, busy: LoRaGpio, irq: Optional[LoRaGpio]=None, txen: Optional[LoRaGpio]=None, rxen: Optional[LoRaGpio]=None):
+    def __init__(self, spi: LoRaSpi, cs: Optional[LoRaGpio], reset: LoRaGpio, busy: LoRaGpio, irq: Optional[LoRaGpio]=None, txen: Optional[LoRaGpio]=None, rxen: Optional[LoRaGpio]=None):
 
         self._spi = spi
         self._cs = cs
         self._reset = reset
         self._busy = busy
+        # set after reset, wake and commands outside _BUSY_FAST_OPCODES, busy pin is checked only then
+        self._busyPending = True
         self._irq = irq
+        # one long-lived monitor per radio dispatches IRQ pin edges to the handler of current operation
+        self._irqMonitor = LoRaIrq(irq) if irq != None else None
         self._txen = txen
         self._rxen = rxen
 
@@ -302,7 +307,11 @@ class SX126x(BaseLoRa) :
 
     def end(self) :
 
-        self.sleep(self.SLEEP_COLD_START)
+        try :
+            self.sleep(self.SLEEP_COLD_START)
+        finally :
+            # stop interrupt monitor thread, started again by next operation, also when radio not responding
+            if self._irqMonitor != None : self._irqMonitor.close()
 
     def reset(self) -> bool :
 
@@ -310,6 +319,7 @@ class SX126x(BaseLoRa) :
         self._reset.output(LoRaGpio.LOW)
         time.sleep(0.001)
         self._reset.output(LoRaGpio.HIGH)
+        self._busyPending = True
         return not self.busyCheck()
 
     def sleep(self, option = SLEEP_WARM_START) :
@@ -324,6 +334,7 @@ class SX126x(BaseLoRa) :
         # wake device by set wake pin (cs pin) to low before spi transaction and put device in standby mode
         self._cs.output(LoRaGpio.LOW)
         time.sleep(0.0005)
+        self._busyPending = True
         self.setStandby(self.STANDBY_RC)
         self._fixResistanceAntenna()
 
@@ -333,10 +344,12 @@ class SX126x(BaseLoRa) :
 
     def busyCheck(self, timeout: int = _busyTimeout) :
 
-        # wait for busy pin to LOW or timeout reached
-        t = time.time()
-        while self._busy.input() == LoRaGpio.HIGH :
-            if (time.time() - t) > (timeout / 1000) : return True
+        # skip when last command is known to be done before next SPI transfer
+        if not self._busyPending : return False
+        # single read of busy pin usually finds it already low, otherwise sleep until falling edge
+        if self._busy.input() != LoRaGpio.LOW and not self._busy.waitLevel(LoRaGpio.LOW, timeout / 1000) :
+            return True
+        self._busyPending = False
         return False
 
     def setFallbackMode(self, fallbackMode) :
@@ -577,6 +590,26 @@ class SX126x(BaseLoRa) :
             )
         self.writeRegister(self.REG_LORA_SYNC_WORD_MSB, buf, 2)
 
+    def applyProfile(self, profile: RadioProfile, verify: bool = True) -> bool :
+
+        # modulation and packet parameters are one command each instead of one per setter
+        if self._modem != self.LORA_MODEM : self.setModem(self.LORA_MODEM)
+        self.setFrequency(profile.frequency)
+        self.setRxGain(self.RX_GAIN_BOOSTED if profile.rxBoost else self.RX_GAIN_POWER_SAVING)
+        self.setLoRaModulation(profile.sf, profile.bw, profile.cr, profile.ldro)
+        self.setLoRaPacket(profile.headerType, profile.preambleLength, profile.payloadLength, profile.crcType, self._invertIq)
+        self.setSyncWord(profile.syncWord)
+        if not verify : return True
+
+        # modulation and packet parameters can not be read back, verify packet type, sync word and gain
+        sw = profile.syncWord
+        syncWord = ((sw >> 8) & 0xFF, sw & 0xFF)
+        if sw <= 0xFF : syncWord = ((sw & 0xF0) | 0x04, ((sw << 4) | 0x04) & 0xFF)
+        gain = self.BOOSTED_GAIN if profile.rxBoost else self.POWER_SAVING_GAIN
+        if self.getPakcetType() != self.LORA_MODEM : return False
+        if tuple(self.readRegister(self.REG_LORA_SYNC_WORD_MSB, 2)) != syncWord : return False
+        return tuple(self.readRegister(self.REG_RX_GAIN, 1)) == (gain,)
+
     def setFskModulation(self, br: int, pulseShape: int, bandwidth: int, fdev: int) :
 
         self.setModulationParamsFsk(br, pulseShape, bandwidth, fdev)
@@ -635,17 +668,14 @@ class SX126x(BaseLoRa) :
         txTimeout = timeout << 6
         if txTimeout > 0x00FFFFFF : txTimeout = self.TX_SINGLE
 
+        # attach TX interrupt handler before the edge can occur
+        if self._irq != None :
+            to = self._irqTimeout/1000 if timeout == self.TX_SINGLE else timeout/1000
+            self._irqMonitor.arm(self._interruptTx, to)
+
         # set device to transmit mode with configured timeout or single operation
         self.setTx(txTimeout)
         self._transmitTime = time.time()
-
-        # set operation status to wait and attach TX interrupt handler
-        if self._irq != None :
-            if isinstance(self._monitoring, Thread):
-                self._monitoring.join()
-            to = self._irqTimeout/1000 if timeout == self.TX_SINGLE else timeout/1000
-            self._monitoring = Thread(target=self._irq.monitor, args=(self._interruptTx, to))
-            self._monitoring.start()
         return True
 
     def write(self, data, length: int = 0) :
@@ -702,20 +732,16 @@ class SX126x(BaseLoRa) :
             self._txen.output(LoRaGpio.LOW)
             self._rxen.output(LoRaGpio.HIGH)
 
-        # set device to receive mode with configured timeout, single, or continuous operation
-        self.setRx(rxTimeout)
-
-        # set operation status to wait and attach RX interrupt handler
+        # attach RX interrupt handler before the edge can occur
         if self._irq != None :
-            if isinstance(self._monitoring, Thread):
-                self._monitoring.join()
             to = self._irqTimeout/1000 if timeout == self.RX_SINGLE else timeout/1000
-            if timeout == self.RX_CONTINUOUS:
-                self._monitoring = Thread(target=self._irq.monitor_continuous, args=(self._interruptRxContinuous, to))
-                self._monitoring.setDaemon(True)
-            else:
-                self._monitoring = Thread(target=self._irq.monitor, args=(self._interruptRx, to))
-            self._monitoring.start()
+            if timeout == self.RX_CONTINUOUS :
+                self._irqMonitor.arm(self._interruptRxContinuous, None, True)
+            else :
+                self._irqMonitor.arm(self._interruptRx, to)
+
+        # set device to receive mode with configured timeout, single, or continuous operation
+        self.setRx(rxTimeout)
         return True
 
     def listen(self, rxPeriod: int, sleepPeriod: int) -> bool :
@@ -742,16 +768,13 @@ class SX126x(BaseLoRa) :
             self._txen.output(LoRaGpio.LOW)
             self._rxen.output(LoRaGpio.HIGH)
 
-        # set device to receive mode with configured receive and sleep period
-        self.setRxDutyCycle(rxPeriod, sleepPeriod)
-
-        # set operation status to wait and attach RX interrupt handler
+        # attach RX interrupt handler before the edge can occur
         if self._irq != None :
-            if isinstance(self._monitoring, Thread):
-                self._monitoring.join()
             to = self._irqTimeout/1000 if rxPeriod == self.RX_SINGLE else rxPeriod/1000
-            self._monitoring = Thread(target=self._irq.monitor, args=(self._interruptRx, to))
-            self._monitoring.start()
+            self._irqMonitor.arm(self._interruptRx, to)
+
+        # set device to receive mode with configured receive and sleep period
+        self.setRxDutyCycle(rxPeriod, sleepPeriod)
         return True
 
     def available(self) -> int :
@@ -812,6 +835,11 @@ class SX126x(BaseLoRa) :
         while irqStat == 0x0000 and self._statusIrq == 0x0000 :
             # only check IRQ status register for non interrupt operation
             if self._irq == None : irqStat = self.getIrqStatus()
+            # run interrupt handler on this thread when monitor thread disabled
+            elif not self._irqMonitor.threaded :
+                remaining = LoRaIrq.POLL_INTERVAL
+                if timeout > 0 : remaining = max(0, timeout - (time.time() - t))
+                self._irqMonitor.dispatch(remaining)
             # return when timeout reached
             if (time.time() - t) > timeout and timeout > 0 : return False
 
@@ -840,6 +868,11 @@ class SX126x(BaseLoRa) :
         self._statusIrq = irqStat
         return True
 
+    def ready(self) -> bool :
+
+        # true when wait() returns without blocking: interrupt handler stored status of finished operation
+        return bool(self._statusIrq)
+
     def status(self) -> int :
 
         # set back status IRQ for RX continuous operation
@@ -902,6 +935,9 @@ class SX126x(BaseLoRa) :
 
         # clear IRQ status of previous transmit or receive operation
         self.clearIrqStatus(0x03FF)
+        # stop handling edges of previous operation, handler still running is waited for
+        if self._irqMonitor != None :
+            self._irqMonitor.disarm()
         # set selected interrupt source
         dio1Mask = 0x0000
         dio2Mask = 0x0000
@@ -955,6 +991,23 @@ class SX126x(BaseLoRa) :
         if callable(self._onReceive) :
             self._onReceive()
 
+    def setIrqThread(self, enable: bool) :
+
+        # handle IRQ pin edges on monitor thread, or on caller thread inside wait() and handleIrq()
+        if self._irqMonitor != None :
+            self._irqMonitor.close()
+            self._irqMonitor.threaded = enable
+
+    def irqFileno(self) -> int :
+
+        # file descriptor readable on IRQ pin edge, call handleIrq() when readable with monitor thread disabled
+        return self._irqMonitor.fileno()
+
+    def handleIrq(self) -> int :
+
+        # run interrupt handler for pending IRQ pin edges without blocking
+        return self._irqMonitor.dispatch(0)
+
     def onTransmit(self, callback) :
 
         # register onTransmit function to call every transmit done
@@ -1251,18 +1304,26 @@ class SX126x(BaseLoRa) :
 
     def _writeBytes(self, opCode: int, data: tuple, nBytes: int) :
         if self.busyCheck() : return
+        self._busyPending = opCode not in self._BUSY_FAST_OPCODES
         buf = [opCode]
         for i in range(nBytes) : buf.append(data[i])
-        self._cs.output(LoRaGpio.LOW)
-        self._spi.transfer(buf)
-        self._cs.output(LoRaGpio.HIGH)
+        if self._spi.hardwareCs :
+            self._spi.transfer(buf)
+        else :
+            self._cs.output(LoRaGpio.LOW)
+            self._spi.transfer(buf)
+            self._cs.output(LoRaGpio.HIGH)
 
     def _readBytes(self, opCode: int, nBytes: int, address: tuple = (), nAddress: int = 0) -> tuple :
         if self.busyCheck() : return ()
+        self._busyPending = opCode not in self._BUSY_FAST_OPCODES
         buf = [opCode]
         for i in range(nAddress) : buf.append(address[i])
         for i in range(nBytes) : buf.append(0x00)
-        self._cs.output(LoRaGpio.LOW)
-        feedback = self._spi.transfer(buf)
-        self._cs.output(LoRaGpio.HIGH)
+        if self._spi.hardwareCs :
+            feedback = self._spi.transfer(buf)
+        else :
+            self._cs.output(LoRaGpio.LOW)
+            feedback = self._spi.transfer(buf)
+            self._cs.output(LoRaGpio.HIGH)
         return tuple(feedback[nAddress+1:])
@@ -1,7 +1,8 @@
-from .base import LoRaSpi, LoRaGpio, BaseLoRa
+from .base import LoRaSpi, LoRaGpio, LoRaIrq, BaseLoRa, RadioProfile
 from typing import Optional
 import time
-from threading import Thread
+from collections import deque
+from threading import Event, Lock
 
 class SX127x(BaseLoRa) :
     """Class for SX1276/77/78/79 LoRa chipsets from Semtech"""
@@ -147,6 +148,7 @@ class SX127x(BaseLoRa) :
 
     # SPI and GPIO pin setting
     _irqTimeout = 10000
+    _pollInterval = 0.001
     _txState = LoRaGpio.LOW
     _rxState = LoRaGpio.LOW
 
@@ -165,24 +167,47 @@ class SX127x(BaseLoRa) :
     _invertIq = False
 
     # Operation properties
-    _monitoring = None
     _payloadTxRx = 32
     _statusWait = STATUS_DEFAULT
     _statusIrq = STATUS_DEFAULT
     _transmitTime = 0.0
+    _version = 0x12
+    _packetRssi = 0
+    _packetSnr = 0
 
     # callback functions
     _onTransmit = None
     _onReceive = None
 
-    def __init__(self, spi: LoRaSpi, cs: LoRaGpio, reset: LoRaGpio, irq: Optional[LoRaGpio]=None, txen: Optional[LoRaGpio]=None, rxen: Optional[LoRaGpio]=None):
+    # registers changed by the chip itself or with read side effects, never served from the register cache
+    _VOLATILE_REGISTERS = frozenset((REG_FIFO, REG_OP_MODE, REG_FIFO_ADDR_PTR, REG_FIFO_RX_CURRENT_ADDR,
+        REG_IRQ_FLAGS, REG_RX_NB_BYTES, REG_RX_HEADR_CNT_VALUE_MSB, REG_RX_HEADR_CNT_VALUE_LSB,
+        REG_RX_PKT_CNT_VALUE_MSB, REG_RX_PKT_CNT_VALUE_LSB, REG_MODEB_STAT, REG_PKT_SNR_VALUE,
+        REG_PKT_RSSI_VALUE, REG_RSSI_VALUE, REG_HOP_CHANNEL, REG_FIFO_RX_BYTE_ADDR, REG_FREQ_ERROR_MSB,
+        REG_FREQ_ERROR_MID, REG_FREQ_ERROR_LSB, REG_RSSI_WIDEBAND, REG_FORMER_TEMP))
+
+    def __init__(self, spi: LoRaSpi, cs: Optional[LoRaGpio], reset: LoRaGpio, irq: Optional[LoRaGpio]=None, txen: Optional[LoRaGpio]=None, rxen: Optional[LoRaGpio]=None):
 
         self._spi = spi
         self._cs = cs
         self._reset = reset
         self._irq = irq
+        # one long-lived monitor per radio dispatches DIO0 edges to the handler of current operation
+        self._irqMonitor = LoRaIrq(irq) if irq != None else None
         self._txen = txen
         self._rxen = rxen
+        # set by interrupt handlers so wait() can sleep until DIO0 edge instead of polling
+        self._irqEvent = Event()
+        self._irqWakeTime = 0.0
+        # shadow copy of configuration registers, None when register cache is disabled
+        self._cache = None
+        # RX status snapshots (IRQ flags, FIFO start, length, raw SNR, raw RSSI) of frames received in
+        # RX continuous mode and not yet read. Frames stay in the FIFO until overwritten 256 bytes later
+        self._rxQueue = deque(maxlen=8)
+        # interrupt handler thread and caller share the SPI bus
+        self._spiLock = Lock()
+        # last known values of register 0x06 - 0x39 written by applyProfile(), None until first read
+        self._profileImage = None
 
 ### COMMON OPERATIONAL METHODS ###
 
@@ -201,7 +226,11 @@ class SX127x(BaseLoRa) :
 
     def end(self) :
 
-        self.sleep()
+        try :
+            self.sleep()
+        finally :
+            # stop interrupt monitor thread, started again by next operation, also when radio not responding
+            if self._irqMonitor != None : self._irqMonitor.close()
 
     def reset(self) :
 
@@ -210,13 +239,17 @@ class SX127x(BaseLoRa) :
         time.sleep(0.001)
         self._reset.output(LoRaGpio.HIGH)
         time.sleep(0.005)
+        # registers are back to reset values, drop cached configuration
+        if self._cache is not None : self._cache.clear()
+        self._profileImage = None
         # wait until device connected, return false when device too long to respond
         t = time.time()
         version = 0x00
         while version != 0x12 and version !=0x22 :
-            version = self.readRegister(self.REG_VERSION)
+            version = self._transfer(self.REG_VERSION, 0x00)
             if time.time() - t > 1 :
                 return False
+        self._version = version
         return True
 
     def sleep(self) :
@@ -365,6 +398,10 @@ class SX127x(BaseLoRa) :
     def setBandwidth(self, bw: int) :
 
         self._bw = bw
+        self.writeBits(self.REG_MODEM_CONFIG_1, self._bandwidthConfig(bw), 4, 4)
+
+    def _bandwidthConfig(self, bw: int) -> int :
+
         bwCfg = 9                       # 500 kHz
         if bw < 9100 : bwCfg = 0        # 7.8 kHz
         elif bw < 13000 : bwCfg = 1     # 10.4 kHz
@@ -375,7 +412,7 @@ class SX127x(BaseLoRa) :
         elif bw < 93800 : bwCfg = 6     # 62.5 kHz
         elif bw < 187500 : bwCfg = 7    # 125 kHz
         elif bw < 375000 : bwCfg = 8    # 250 kHz
-        self.writeBits(self.REG_MODEM_CONFIG_1, bwCfg, 4, 4)
+        return bwCfg
 
     def setCodeRate(self, cr: int) :
 
@@ -433,6 +470,67 @@ class SX127x(BaseLoRa) :
             sw = ((syncWord >> 8) & 0xF0) | (syncWord & 0x0F)
         self.writeRegister(self.REG_SYNC_WORD, sw)
 
+    def applyProfile(self, profile: RadioProfile, verify: bool = True) -> bool :
+
+        # register values of profile, address -> (value, mask of bits set by profile)
+        frf = int((profile.frequency << 19) / 32000000)
+        sf = min(max(profile.sf, 6), 12)
+        cr = min(max(profile.cr, 5), 8) - 4
+        level = min(profile.rxGainLevel, 6)
+        header = self.HEADER_IMPLICIT if profile.headerType == self.HEADER_IMPLICIT else self.HEADER_EXPLICIT
+        sw = profile.syncWord
+        if sw > 0xFF : sw = ((sw >> 8) & 0xF0) | (sw & 0x0F)
+        image = {
+            self.REG_FRF_MSB: ((frf >> 16) & 0xFF, 0xFF),
+            self.REG_FRF_MID: ((frf >> 8) & 0xFF, 0xFF),
+            self.REG_FRF_LSB: (frf & 0xFF, 0xFF),
+            self.REG_LNA: ((0x03 if profile.rxBoost else 0x00) | (level << 5), 0xFF),
+            self.REG_MODEM_CONFIG_1: ((self._bandwidthConfig(profile.bw) << 4) | (cr << 1) | header, 0xFF),
+            self.REG_MODEM_CONFIG_2: ((sf << 4) | (0x04 if profile.crcType else 0x00), 0xF4),
+            self.REG_PREAMBLE_MSB: ((profile.preambleLength >> 8) & 0xFF, 0xFF),
+            self.REG_PREAMBLE_LSB: (profile.preambleLength & 0xFF, 0xFF),
+            self.REG_PAYLOAD_LENGTH: (profile.payloadLength & 0xFF, 0xFF),
+            self.REG_MODEM_CONFIG_3: ((0x08 if profile.ldro else 0x00) | (0x04 if level == self.RX_GAIN_AUTO else 0x00), 0x0C),
+            self.REG_DETECTION_OPTIMIZE: (0x05 if sf == 6 else 0x03, 0xFF),
+            self.REG_DETECTION_THRESHOLD: (0x0C if sf == 6 else 0x0A, 0xFF),
+            self.REG_SYNC_WORD: (sw, 0xFF)
+        }
+
+        # registers in between keep their values, read only on first apply after reset
+        start = self.REG_FRF_MSB
+        length = self.REG_SYNC_WORD - start + 1
+        if self._profileImage is None :
+            self._profileImage = self.readRegisters(start, length)
+        span = list(self._profileImage)
+        for address, (value, mask) in image.items() :
+            span[address - start] = (span[address - start] & ~mask) | value
+        # writing back pending IRQ flags would clear them
+        span[self.REG_IRQ_FLAGS - start] = 0x00
+        self.writeRegisters(start, span)
+
+        self._frequency = profile.frequency
+        self._sf = profile.sf
+        self._bw = profile.bw
+        self._cr = profile.cr
+        self._ldro = profile.ldro
+        self._headerType = header
+        self._preambleLength = profile.preambleLength
+        self._payloadLength = profile.payloadLength
+        self._crcType = profile.crcType
+
+        # verify with single burst read back, only bits set by profile are compared
+        if verify :
+            span = self.readRegisters(start, length)
+            if len(span) != length or any((span[address - start] & mask) != value for address, (value, mask) in image.items()) :
+                self._profileImage = None
+                if self._cache is not None : self._cache.clear()
+                return False
+        self._profileImage = span
+        if self._cache is not None :
+            for address in range(start, start + length) :
+                if address not in self._VOLATILE_REGISTERS : self._cache[address] = span[address - start]
+        return True
+
 ### TRANSMIT RELATED METHODS ###
 
     def beginPacket(self) :
@@ -456,6 +554,7 @@ class SX127x(BaseLoRa) :
 
         # clear IRQ flag from last TX or RX operation
         self.writeRegister(self.REG_IRQ_FLAGS, 0xFF)
+        self._clearIrqEvents()
 
         # set packet payload length
         self.writeRegister(self.REG_PAYLOAD_LENGTH, self._payloadTxRx)
@@ -464,18 +563,15 @@ class SX127x(BaseLoRa) :
         self._statusWait = self.STATUS_TX_WAIT
         self._statusIrq = 0x00
 
-        # set device to transmit mode
-        self.writeRegister(self.REG_OP_MODE, self._modem | self.MODE_TX)
-        self._transmitTime = time.time()
-
-        # set TX done interrupt on DIO0 and attach TX interrupt handler
+        # set TX done interrupt on DIO0 and attach TX interrupt handler before the edge can occur
         if self._irq != None :
             self.writeRegister(self.REG_DIO_MAPPING_1, self.DIO0_TX_DONE)
-            if isinstance(self._monitoring, Thread):
-                self._monitoring.join()
             to = self._irqTimeout/1000 if timeout == 0 else timeout/1000
-            self._monitoring = Thread(target=self._irq.monitor, args=(self._interruptTx, to))
-            self._monitoring.start()
+            self._irqMonitor.arm(self._interruptTx, to)
+
+        # set device to transmit mode
+        self.writeRegister(self.REG_OP_MODE, self._modem | self.MODE_TX)
+        self._transmitTime = time.time()
         return True
 
     def write(self, data, length: int = 0) :
@@ -518,6 +614,7 @@ class SX127x(BaseLoRa) :
 
         # clear IRQ flag from last TX or RX operation
         self.writeRegister(self.REG_IRQ_FLAGS, 0xFF)
+        self._clearIrqEvents()
 
         # save current txen and rxen pin state and set txen pin to low and rxen pin to high
         if self._txen != None and self._rxen != None :
@@ -529,6 +626,7 @@ class SX127x(BaseLoRa) :
         # set status to RX wait
         self._statusWait = self.STATUS_RX_WAIT
         self._statusIrq = 0x00
+        self._rxQueue.clear()
 
         # select RX mode to RX continuous mode for RX single and continuos operation
         rxMode = self.MODE_RX_CONTINUOUS
@@ -542,21 +640,17 @@ class SX127x(BaseLoRa) :
             self.writeBits(self.REG_MODEM_CONFIG_2, (symbTimeout >> 8) & 0x03, 0, 2)
             self.writeRegister(self.REG_SYMB_TIMEOUT_LSB, symbTimeout & 0xFF)
 
-        # set device to receive mode
-        self.writeRegister(self.REG_OP_MODE, self._modem | rxMode)
-
-        # set RX done interrupt on DIO0 and attach RX interrupt handler
+        # set RX done interrupt on DIO0 and attach RX interrupt handler before the edge can occur
         if self._irq != None :
             self.writeRegister(self.REG_DIO_MAPPING_1, self.DIO0_RX_DONE)
-            if isinstance(self._monitoring, Thread):
-                self._monitoring.join()
-            to = self._irqTimeout/1000 if timeout == 0 else timeout/1000
-            if timeout == self.RX_CONTINUOUS:
-                self._monitoring = Thread(target=self._irq.monitor_continuous, args=(self._interruptRxContinuous, to))
-                self._monitoring.setDaemon(True)
-            else:
-                self._monitoring = Thread(target=self._irq.monitor, args=(self._interruptRx, to))
-            self._monitoring.start()
+            # RX without timeout and RX continuous keep monitoring DIO0 until a packet arrives
+            if timeout == self.RX_CONTINUOUS :
+                self._irqMonitor.arm(self._interruptRxContinuous, None, True)
+            else :
+                self._irqMonitor.arm(self._interruptRx, None if timeout == 0 else timeout/1000)
+
+        # set device to receive mode
+        self.writeRegister(self.REG_OP_MODE, self._modem | rxMode)
         return True
 
     def available(self) :
@@ -578,10 +672,8 @@ class SX127x(BaseLoRa) :
             self._payloadTxRx -= length
         else :
             self._payloadTxRx = 0
-        # read multiple bytes of received package in FIFO buffer
-        data = tuple()
-        for i in range(length) :
-            data = data + (self.readRegister(self.REG_FIFO),)
+        # read multiple bytes of received package in FIFO buffer with single SPI transaction
+        data = tuple(self.readRegisters(self.REG_FIFO, length))
 
         # return single byte or tuple
         if single : 
@@ -595,13 +687,22 @@ class SX127x(BaseLoRa) :
             self._payloadTxRx -= length
         else :
             self._payloadTxRx = 0
-        # read data from FIFO buffer and update payload length
-        data = tuple()
-        for i in range(length) :
-            data = data + (self.readRegister(self.REG_FIFO),)
+        # read data from FIFO buffer with single SPI transaction and return array of bytes
+        return bytes(self.readRegisters(self.REG_FIFO, length))
 
-        # return array of bytes
-        return bytes(data)
+    def readInto(self, buffer, length: int = 0) -> int :
+
+        # read remaining or requested payload length, limited to buffer size
+        if length == 0 or length > self._payloadTxRx :
+            length = self._payloadTxRx
+        if length > len(buffer) :
+            length = len(buffer)
+        self._payloadTxRx -= length
+
+        # read data from FIFO buffer into preallocated bytearray or memoryview with single SPI transaction
+        if length :
+            buffer[:length] = self.readRegisters(self.REG_FIFO, length)
+        return length
 
     def purge(self, length: int = 0) :
 
@@ -618,17 +719,28 @@ class SX127x(BaseLoRa) :
         # immediately return when currently not waiting transmit or receive process
         if self._statusIrq : return True
 
-        # wait transmit or receive process finish by checking interrupt status or IRQ status
+        # take next frame received in RX continuous mode
+        if self._statusWait == self.STATUS_RX_CONTINUOUS :
+            return self._waitRxContinuous(timeout)
+
+        # sleep until interrupt handler signal DIO0 edge for interrupt operation
+        if self._irq != None :
+            if not self._waitIrq(timeout) : return False
+            self._irqWakeTime = time.monotonic()
+            return True
+
+        # wait transmit or receive process finish by checking IRQ status
         irqFlag = 0x00
         irqFlagMask = self.IRQ_RX_DONE | self.IRQ_RX_TIMEOUT | self.IRQ_CRC_ERR
         if self._statusWait == self.STATUS_TX_WAIT :
             irqFlagMask = self.IRQ_TX_DONE
         t = time.time()
         while not (irqFlag & irqFlagMask) and self._statusIrq == 0x00 :
-            # only check IRQ status register for non interrupt operation
-            if self._irq == None : irqFlag = self.readRegister(self.REG_IRQ_FLAGS)
+            irqFlag = self.readRegister(self.REG_IRQ_FLAGS)
+            if irqFlag & irqFlagMask : break
             # return when timeout reached
             if time.time() - t > timeout and timeout > 0 : return False
+            time.sleep(self._pollInterval)
 
         if self._statusIrq :
             # immediately return when interrupt signal hit
@@ -644,31 +756,47 @@ class SX127x(BaseLoRa) :
         elif self._statusWait == self.STATUS_RX_WAIT :
             # terminate receive mode by setting mode to standby
             self.standby()
-            # set pointer to RX buffer base address and get packet payload length
-            self.writeRegister(self.REG_FIFO_ADDR_PTR, self.readRegister(self.REG_FIFO_RX_CURRENT_ADDR))
-            self._payloadTxRx = self.readRegister(self.REG_RX_NB_BYTES)
+            # set pointer to RX buffer base address, get packet payload length and packet status
+            self._loadRxStatus(self._readRxStatus())
             # set back txen and rxen pin to previous state
             if self._txen != None and self._rxen != None :
                 self._txen.output(self._txState)
                 self._rxen.output(self._rxState)
 
-        elif self._statusWait == self.STATUS_RX_CONTINUOUS :
-            # set pointer to RX buffer base address and get packet payload length
-            self.writeRegister(self.REG_FIFO_ADDR_PTR, self.readRegister(self.REG_FIFO_RX_CURRENT_ADDR))
-            self._payloadTxRx = self.readRegister(self.REG_RX_NB_BYTES)
-            # clear IRQ flag
-            self.writeRegister(self.REG_IRQ_FLAGS, 0xFF)
-
         # store IRQ status
         self._statusIrq = irqFlag
         return True
 
+    def _waitRxContinuous(self, timeout: int) -> bool :
+
+        t = time.time()
+        while not self._rxQueue :
+            remaining = timeout - (time.time() - t)
+            if timeout > 0 and remaining <= 0 : return False
+            if self._irq != None :
+                # interrupt handler queues RX status snapshot before signaling
+                if not self._waitIrq(remaining if timeout > 0 else 0) : return False
+                self._irqEvent.clear()
+                self._irqWakeTime = time.monotonic()
+            elif not (self.readRegister(self.REG_IRQ_FLAGS) & self.IRQ_RX_DONE and self._queueRxContinuous()) :
+                time.sleep(self._pollInterval)
+
+        # point FIFO to oldest unread frame, the radio keeps receiving behind it
+        self._statusIrq = self._loadRxStatus(self._rxQueue.popleft())
+        return True
+
+    def ready(self) -> bool :
+
+        # true when wait() returns without blocking: operation finished or frame received and not yet taken
+        return bool(self._statusIrq) or bool(self._rxQueue)
+
     def status(self) -> int :
 
         # set back status IRQ for RX continuous operation
         statusIrq = self._statusIrq
         if self._statusWait == self.STATUS_RX_CONTINUOUS :
             self._statusIrq = 0x0000
+            self._irqEvent.clear()
 
         # get status for transmit and receive operation based on status IRQ
         if statusIrq & self.IRQ_RX_TIMEOUT : return self.STATUS_RX_TIMEOUT
@@ -684,6 +812,17 @@ class SX127x(BaseLoRa) :
         # get transmit time in millisecond (ms)
         return self._transmitTime * 1000
 
+    def irqLatency(self) -> float :
+
+        # get time between last DIO0 edge and wait() returning in second
+        if self._irq == None or not self._irq.eventTime : return 0.0
+        return self._irqWakeTime - self._irq.eventTime
+
+    def irqStatus(self) -> int :
+
+        # get raw IRQ flags of last operation, read before status() resets them in RX continuous mode
+        return self._statusIrq
+
     def dataRate(self) -> float :
 
         # get data rate last transmitted package in kbps
@@ -695,26 +834,66 @@ class SX127x(BaseLoRa) :
         offset = self.RSSI_OFFSET_HF
         if self._frequency < self.BAND_THRESHOLD :
             offset = self.RSSI_OFFSET_LF
-        if self.readRegister(self.REG_VERSION) == 0x22 :
+        if self._version == 0x22 :
             offset = self.RSSI_OFFSET
-        return self.readRegister(self.REG_PKT_RSSI_VALUE) - offset
+        return self._packetRssi - offset
 
     def rssi(self) -> float :
 
         offset = self.RSSI_OFFSET_HF
         if self._frequency < self.BAND_THRESHOLD :
             offset = self.RSSI_OFFSET_LF
-        if self.readRegister(self.REG_VERSION) == 0x22 :
+        if self._version == 0x22 :
             offset = self.RSSI_OFFSET
         return self.readRegister(self.REG_RSSI_VALUE) - offset
 
     def snr(self) -> float :
 
-        # get signal to noise ratio (SNR) of last incoming package
-        return self.readRegister(self.REG_PKT_SNR_VALUE) / 4.0
+        # get signal to noise ratio (SNR) of last incoming package, register value is signed
+        snr = self._packetSnr
+        if snr > 127 : snr -= 256
+        return snr / 4.0
 
 ### INTERRUPT HANDLER METHODS ###
 
+    def setIrqThread(self, enable: bool) :
+
+        # handle DIO0 edges on monitor thread, or on caller thread inside wait() and handleIrq()
+        if self._irqMonitor != None :
+            self._irqMonitor.close()
+            self._irqMonitor.threaded = enable
+
+    def irqFileno(self) -> int :
+
+        # file descriptor readable on DIO0 edge, call handleIrq() when readable with monitor thread disabled
+        return self._irqMonitor.fileno()
+
+    def handleIrq(self) -> int :
+
+        # run interrupt handler for pending DIO0 edges without blocking
+        return self._irqMonitor.dispatch(0)
+
+    def _waitIrq(self, timeout: float) -> bool :
+
+        # wait interrupt handler signal, dispatching DIO0 edges here when monitor thread disabled
+        if self._irqMonitor.threaded :
+            return self._irqEvent.wait(timeout if timeout > 0 else None)
+        t = time.time()
+        while not self._irqEvent.is_set() :
+            remaining = None
+            if timeout > 0 :
+                remaining = timeout - (time.time() - t)
+                if remaining <= 0 : return False
+            self._irqMonitor.dispatch(remaining)
+        return True
+
+    def _clearIrqEvents(self) :
+
+        # stop handling DIO0 edges of previous operation, handler still running is waited for
+        if self._irqMonitor != None :
+            self._irqMonitor.disarm()
+            self._irqEvent.clear()
+
     def _interruptTx(self) :
 
         # calculate transmit time
@@ -728,18 +907,13 @@ class SX127x(BaseLoRa) :
             self._txen.output(self._txState)
             self._rxen.output(self._rxState)
 
-        # call onTransmit function
+        # wake up wait() and call onTransmit function
+        self._irqEvent.set()
         if callable(self._onTransmit) :
             self._onTransmit()
 
     def _interruptRx(self) :
 
-        # store IRQ status
-        self._statusIrq = self.readRegister(self.REG_IRQ_FLAGS)
-        # set IRQ status to RX done when interrupt occured before register updated
-        if not self._statusIrq & 0xF0 :
-            self._statusIrq = self.IRQ_RX_DONE
-
         # terminate receive mode by setting mode to standby
         self.writeBits(self.REG_OP_MODE, self.MODE_STDBY, 0, 3)
 
@@ -748,32 +922,55 @@ class SX127x(BaseLoRa) :
             self._txen.output(self._txState)
             self._rxen.output(self._rxState)
 
-        # set pointer to RX buffer base address and get packet payload length
-        self.writeRegister(self.REG_FIFO_ADDR_PTR, self.readRegister(self.REG_FIFO_RX_CURRENT_ADDR))
-        self._payloadTxRx = self.readRegister(self.REG_RX_NB_BYTES)
+        # set pointer to RX buffer base address, get packet payload length, packet status and IRQ status
+        statusIrq = self._loadRxStatus(self._readRxStatus())
+        # set IRQ status to RX done when interrupt occured before register updated
+        if not statusIrq & 0xF0 :
+            statusIrq = self.IRQ_RX_DONE
+        self._statusIrq = statusIrq
 
-        # call onReceive function
+        # wake up wait() and call onReceive function
+        self._irqEvent.set()
         if callable(self._onReceive) :
             self._onReceive()
 
     def _interruptRxContinuous(self) :
 
-        # store IRQ status
-        self._statusIrq = self.readRegister(self.REG_IRQ_FLAGS)
-        # set IRQ status to RX done when interrupt occured before register updated
-        if not self._statusIrq & 0xF0 :
-            self._statusIrq = self.IRQ_RX_DONE
-
-        # clear IRQ flag from last TX or RX operation
-        self.writeRegister(self.REG_IRQ_FLAGS, 0xFF)
-
-        # set pointer to RX buffer base address and get packet payload length
-        self.writeRegister(self.REG_FIFO_ADDR_PTR, self.readRegister(self.REG_FIFO_RX_CURRENT_ADDR))
-        self._payloadTxRx = self.readRegister(self.REG_RX_NB_BYTES)
+        # queue RX status snapshot, skip edge of frame already taken
+        if not self._queueRxContinuous() : return
 
-        # call onReceive function
+        # wake up wait() or load frame and call onReceive function
         if callable(self._onReceive) :
+            self._statusIrq = self._loadRxStatus(self._rxQueue.popleft())
             self._onReceive()
+        else :
+            self._irqEvent.set()
+
+    def _readRxStatus(self) -> tuple :
+
+        # single burst over 0x10 - 0x1A so FIFO start, IRQ flags, length, SNR and RSSI belong to same frame
+        status = self.readRegisters(self.REG_FIFO_RX_CURRENT_ADDR, self.REG_PKT_RSSI_VALUE - self.REG_FIFO_RX_CURRENT_ADDR + 1)
+        return (status[2], status[0], status[3], status[9], status[10])
+
+    def _loadRxStatus(self, rxStatus: tuple) -> int :
+
+        # set pointer to frame start in FIFO and keep payload length and packet status, return IRQ flags
+        irq, start, length, snr, rssi = rxStatus
+        self.writeRegister(self.REG_FIFO_ADDR_PTR, start)
+        self._payloadTxRx = length
+        self._packetSnr = snr
+        self._packetRssi = rssi
+        return irq
+
+    def _queueRxContinuous(self) -> bool :
+
+        rxStatus = self._readRxStatus()
+        irq = rxStatus[0]
+        if not irq & self.IRQ_RX_DONE : return False
+        # clear only flags of this frame so a frame finishing meanwhile still raises RX done
+        self.writeRegister(self.REG_IRQ_FLAGS, irq)
+        self._rxQueue.append(rxStatus)
+        return True
 
     def onTransmit(self, callback) :
 
@@ -787,27 +984,80 @@ class SX127x(BaseLoRa) :
 
 ### SX127X DRIVER: UTILITIES ###
 
+    def enableCache(self, enable: bool = True) :
+
+        # keep shadow copy of configuration registers so bit updates cost one write and static values one read
+        self._cache = {} if enable else None
+
+    def sync(self) :
+
+        # refresh cached registers from device with single burst read over register 0x01 - 0x70
+        if self._cache is None : return
+        values = self.readRegisters(self.REG_OP_MODE, self.REG_PLL)
+        for address in list(self._cache) :
+            self._cache[address] = values[address - self.REG_OP_MODE]
+
     def writeBits(self, address: int, data: int, position: int, length: int) :
 
-        read = self._transfer(address & 0x7F, 0x00)
+        read = self.readRegister(address)
         mask = (0xFF >> (8 - length)) << position
         write = (data << position) | (read & ~mask)
-        self._transfer(address | 0x80, write)
+        self.writeRegister(address, write)
 
     def writeRegister(self, address: int, data: int) :
 
         self._transfer(address | 0x80, data)
+        address = address & 0x7F
+        if self._cache is not None and address not in self._VOLATILE_REGISTERS :
+            self._cache[address] = data & 0xFF
+        if self._profileImage is not None and self.REG_FRF_MSB <= address <= self.REG_SYNC_WORD :
+            self._profileImage[address - self.REG_FRF_MSB] = data & 0xFF
 
     def readRegister(self, address: int) -> int :
 
-        return self._transfer(address & 0x7F, 0x00)
+        address = address & 0x7F
+        if self._cache is None or address in self._VOLATILE_REGISTERS :
+            return self._transfer(address, 0x00)
+        value = self._cache.get(address)
+        if value is None :
+            value = self._transfer(address, 0x00)
+            if value >= 0 : self._cache[address] = value
+        return value
+
+    def readRegisters(self, address: int, length: int) -> list :
+
+        # burst read, address is auto incremented except for FIFO which is read sequentially
+        return self._transferBurst(address & 0x7F, [0x00] * length)
+
+    def writeRegisters(self, address: int, data: list) :
+
+        # burst write to consecutive registers starting at address
+        self._transferBurst((address & 0x7F) | 0x80, list(data))
+
+    def _transferBurst(self, address: int, data: list) -> list :
+
+        buf = [address] + data
+        with self._spiLock :
+            if self._spi.hardwareCs :
+                feedback = self._spi.transfer(buf)
+            else :
+                self._cs.output(LoRaGpio.LOW)
+                feedback = self._spi.transfer(buf)
+                self._cs.output(LoRaGpio.HIGH)
+        if (len(feedback) == len(buf)) :
+            return feedback[1:]
+        return [0x00] * len(data)
 
     def _transfer(self, address: int, data: int) -> int :
 
         buf = [address, data]
-        self._cs.output(LoRaGpio.LOW)
-        feedback = self._spi.transfer(buf)
-        self._cs.output(LoRaGpio.HIGH)
+        with self._spiLock :
+            if self._spi.hardwareCs :
+                feedback = self._spi.transfer(buf)
+            else :
+                self._cs.output(LoRaGpio.LOW)
+                feedback = self._spi.transfer(buf)
+                self._cs.output(LoRaGpio.HIGH)
         if (len(feedback) == 2) :
             return int(feedback[1])
         return -1
@@ -1,4 +1,6 @@
 # __init__.py
-from .base import LoRaSpi, LoRaGpio
+from .base import LoRaSpi, LoRaGpio, LoRaIrq, RadioProfile
 from .SX126x import SX126x
 from .SX127x import SX127x
+from .trace import TraceWriter, SX127xReplay, readTrace
+# emulator and aio are imported from their modules, so the driver doesn't load them at startup
@@ -0,0 +1,114 @@
+"""asyncio front end for SX126x and SX127x radios.
+
+The interrupt pin's event fd is registered with the running event loop, so frames and transmit done are
+handled on the loop thread without a monitor thread or a blocking wait(). SPI transfers are short and
+run inline. Radios without an interrupt pin fall back to a blocking wait() in a one thread executor.
+
+    from LoRaRF.aio import AsyncLoRa
+
+    radio = AsyncLoRa(LoRa)
+    async for frame in radio:
+        print(frame.payload, frame.rssi, frame.snr)
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import asyncio
+
+# received frame with its packet status, status is the radio's status() value
+ReceivedFrame = namedtuple("ReceivedFrame", ["payload", "rssi", "snr", "status"])
+
+
+class AsyncLoRa:
+
+    def __init__(self, radio, continuous: bool = True):
+        self.radio = radio
+        # keep radio in RX continuous mode between receive() calls instead of a request per frame
+        self.continuous = continuous
+        self._listening = False
+        self._loop = None
+        self._fd = None
+        self._executor = None
+        self._waiters = []
+        self._closed = False
+        # interrupt handlers run on the event loop thread from the fd callback
+        if radio._irq is not None:
+            radio.setIrqThread(False)
+
+    def _attach(self):
+        if self._loop is not None: return
+        self._loop = asyncio.get_running_loop()
+        if self.radio._irq is not None:
+            self._fd = self.radio.irqFileno()
+            self._loop.add_reader(self._fd, self._onIrq)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LoRaRF")
+
+    def _onIrq(self):
+        # run interrupt handler for pending edges, then wake coroutines waiting for the radio
+        self.radio.handleIrq()
+        if self.radio.ready():
+            for waiter in self._waiters:
+                if not waiter.done(): waiter.set_result(True)
+
+    async def _waitReady(self, timeout: Optional[float]) -> bool:
+        if self.radio.ready(): return True
+        if self._fd is None:
+            # no interrupt pin, poll the radio in the executor
+            return await self._loop.run_in_executor(self._executor, self.radio.wait, timeout or 0)
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiters.remove(waiter)
+
+    async def receive(self, timeout: Optional[float] = None) -> Optional[ReceivedFrame]:
+        # wait for next frame, None when timeout in seconds reached first
+        self._attach()
+        radio = self.radio
+        if not self._listening:
+            radio.request(radio.RX_CONTINUOUS if self.continuous else 0)
+            self._listening = self.continuous
+        if not await self._waitReady(timeout): return None
+        radio.wait()
+        payload = radio.get(radio.available())
+        return ReceivedFrame(payload, radio.packetRssi(), radio.snr(), radio.status())
+
+    async def transmit(self, data, timeout: Optional[float] = None) -> bool:
+        # send data and wait for transmit done, True when the radio reports it
+        self._attach()
+        radio = self.radio
+        radio.standby()
+        self._listening = False
+        radio.beginPacket()
+        radio.put(bytes(data))
+        if not radio.endPacket(): return False
+        if not await self._waitReady(timeout): return False
+        radio.wait()
+        return radio.status() == radio.STATUS_TX_DONE
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> ReceivedFrame:
+        # endless stream of received frames until close()
+        while not self._closed:
+            frame = await self.receive(1.0)
+            if frame is not None: return frame
+        raise StopAsyncIteration
+
+    def close(self):
+        self._closed = True
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        for waiter in self._waiters:
+            if not waiter.done(): waiter.cancel()
+        self._loop = None
@@ -1,26 +1,59 @@
-import spidev
-import gpiod
-from typing import Iterable
+# hardware modules are only needed on the Pi, trace replay and emulation run without them
+try:
+    import spidev
+except ImportError:
+    spidev = None
+try:
+    import gpiod
+except ImportError:
+    gpiod = None
+from threading import Thread, RLock, current_thread
+from typing import Iterable, Optional
+import time
 
 
 class LoRaSpi():
 
     SPI_SPEED = 8000000
 
-    def __init__(self, bus: int, cs: int, speed: int = SPI_SPEED):
+    def __init__(self, bus: int, cs: int, speed: int = SPI_SPEED, hardwareCs: bool = False):
         self.bus = bus
         self.cs = cs
         self.speed = speed
+        # when True the kernel chip select frames every transfer and radio drivers skip the CS GPIO
+        self.hardwareCs = hardwareCs
+        self._spi = None
+        self._speed = 0
 
-    def transfer(self, buf: Iterable) -> tuple:
+    def open(self):
+        if self._spi is not None: return
         spi = spidev.SpiDev()
         spi.open(self.bus, self.cs)
         spi.lsbfirst = False
         spi.mode = 0
         spi.max_speed_hz = self.speed
-        ret = spi.xfer2(buf)
-        spi.close()
-        return ret
+        self._spi = spi
+        self._speed = self.speed
+
+    def close(self):
+        if self._spi is None: return
+        self._spi.close()
+        self._spi = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def transfer(self, buf: Iterable) -> tuple:
+        # device is opened on first transfer and kept open until close()
+        if self._spi is None: self.open()
+        if self._speed != self.speed:
+            self._spi.max_speed_hz = self.speed
+            self._speed = self.speed
+        return self._spi.xfer2(buf)
 
 
 class LoRaGpio:
@@ -28,59 +61,262 @@ class LoRaGpio:
     LOW = 0
     HIGH = 1
 
+    # edge options for event requests
+    EDGE_RISING = 1
+    EDGE_FALLING = 2
+    EDGE_BOTH = 3
+
+    # line request types, the line is requested once and kept until close()
+    _REQ_NONE = 0
+    _REQ_OUT = 1
+    _REQ_IN = 2
+    _REQ_EVENT = 3
+
     def __init__(self, chip: int, offset: int):
         self.chip = "gpiochip" + str(chip)
         self.offset = offset
+        # kernel timestamp (CLOCK_MONOTONIC) of the last edge seen by monitor
+        self.eventTime = 0.0
+        self._chip = None
+        self._line = None
+        self._request = self._REQ_NONE
+        self._edge = 0
+
+    def _requestLine(self, request: int, value: int = 0, edge: int = EDGE_RISING):
+        # reuse current line request when it already has needed direction
+        if self._request == request and (request != self._REQ_EVENT or self._edge == edge):
+            return self._line
+        # switch direction of a requested line without releasing it
+        if self._request in (self._REQ_OUT, self._REQ_IN) and request in (self._REQ_OUT, self._REQ_IN):
+            try:
+                if request == self._REQ_OUT: self._line.set_direction_output(value)
+                else: self._line.set_direction_input()
+                self._request = request
+                return self._line
+            except AttributeError: pass
+        self.release()
+        if self._chip is None: self._chip = gpiod.Chip(self.chip)
+        line = self._chip.get_line(self.offset)
+        if request == self._REQ_OUT:
+            line.request(consumer="LoRaGpio", type=gpiod.LINE_REQ_DIR_OUT, default_val=value)
+        elif request == self._REQ_IN:
+            line.request(consumer="LoRaGpio", type=gpiod.LINE_REQ_DIR_IN)
+        else:
+            types = {self.EDGE_RISING: gpiod.LINE_REQ_EV_RISING_EDGE,
+                     self.EDGE_FALLING: gpiod.LINE_REQ_EV_FALLING_EDGE,
+                     self.EDGE_BOTH: gpiod.LINE_REQ_EV_BOTH_EDGES}
+            line.request(consumer="LoRaGpio", type=types[edge])
+            self._edge = edge
+        self._line = line
+        self._request = request
+        return line
+
+    def release(self):
+        if self._line is not None:
+            try: self._line.release()
+            except: pass
+        self._line = None
+        self._request = self._REQ_NONE
+
+    def close(self):
+        self.release()
+        if self._chip is not None:
+            self._chip.close()
+            self._chip = None
 
     def output(self, value: int):
-        chip = gpiod.Chip(self.chip)
-        line = chip.get_line(self.offset)
         try:
-            line.request(consumer="LoRaGpio", type=gpiod.LINE_REQ_DIR_OUT)
-            line.set_value(value)
-        except: return
-        finally:
-            line.release()
-            chip.close()
+            if self._request == self._REQ_OUT:
+                self._line.set_value(value)
+            else:
+                # new output request or direction switch already drives the line with value
+                self._requestLine(self._REQ_OUT, value)
+        except: self.release()
 
     def input(self) -> int:
-        chip = gpiod.Chip(self.chip)
-        line = chip.get_line(self.offset)
         try:
-            line.request(consumer="LoRaGpio", type=gpiod.LINE_REQ_DIR_IN)
-            value = line.get_value()
-        except: return -1
-        finally:
-            line.release()
-            chip.close()
-        return value
-
-    def monitor(self, callback, timeout: float):
-        seconds = int(timeout)
-        chip = gpiod.Chip(self.chip)
-        line = chip.get_line(self.offset)
+            # value of an output or event line can be read without changing its direction
+            if self._request != self._REQ_NONE:
+                return self._line.get_value()
+            return self._requestLine(self._REQ_IN).get_value()
+        except:
+            self.release()
+            return -1
+
+    def waitEvents(self, timeout: Optional[float], edge: int = EDGE_RISING) -> list:
+        # wait for edges and return timestamps of all pending events read in one batch
+        # timeout None waits until an edge arrives, empty list returned when timeout reached
+        line = self._requestLine(self._REQ_EVENT, edge=edge)
+        seconds = 1 if timeout is None else int(timeout)
+        nanoseconds = 0 if timeout is None else int((timeout - seconds) * 1000000000)
+        while not line.event_wait(seconds, nanoseconds):
+            if timeout is not None: return []
+        events = line.event_read_multiple()
+        times = [event.sec + event.nsec / 1000000000 for event in events]
+        self.eventTime = times[-1]
+        return times
+
+    def waitLevel(self, value: int, timeout: float) -> bool:
+        # wait until line reads value, sleeping on the edge towards it instead of polling
+        # returns False when timeout in seconds reached first
+        edge = self.EDGE_FALLING if value == self.LOW else self.EDGE_RISING
+        try:
+            line = self._requestLine(self._REQ_EVENT, edge=edge)
+            # drop edges of earlier transitions, an edge after reading the value stays pending
+            while line.event_wait(0, 0): line.event_read_multiple()
+            deadline = time.monotonic() + timeout
+            while line.get_value() != value:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: return False
+                if line.event_wait(int(remaining), int((remaining % 1) * 1000000000)):
+                    line.event_read_multiple()
+            return True
+        except:
+            self.release()
+        # edge events not available on this line, poll its value
+        deadline = time.monotonic() + timeout
+        while self.input() != value:
+            if time.monotonic() > deadline: return False
+        return True
+
+    def events(self, timeout: Optional[float] = None, edge: int = EDGE_RISING):
+        # reusable edge event stream, yield timestamp of every edge until timeout reached
+        while True:
+            times = self.waitEvents(timeout, edge)
+            if not times: return
+            for t in times: yield t
+
+    def fileno(self, edge: int = EDGE_RISING) -> int:
+        # file descriptor of the event line, readable while edges are pending (for select or an event loop)
+        return self._requestLine(self._REQ_EVENT, edge=edge).event_get_fd()
+
+    def clearEvents(self, edge: int = EDGE_RISING):
+        # discard edges which happened while nobody was monitoring the line
+        try:
+            line = self._requestLine(self._REQ_EVENT, edge=edge)
+            while line.event_wait(0, 0): line.event_read_multiple()
+        except: self.release()
+
+    def monitor(self, callback, timeout: Optional[float]):
+        # timeout None waits until an edge arrives
         try:
-            line.request(consumer="LoRaGpio", type=gpiod.LINE_REQ_EV_RISING_EDGE)
-            if line.event_wait(seconds, int((timeout - seconds) * 1000000000)):
+            if self.waitEvents(timeout):
                 callback()
-        except: return
-        finally:
-            line.release()
-            chip.close()
+        except: self.release()
 
     def monitor_continuous(self, callback, timeout: float):
-        seconds = int(timeout)
         while True:
-            chip = gpiod.Chip(self.chip)
-            line = chip.get_line(self.offset)
             try:
-                line.request(consumer="LoRaGpio", type=gpiod.LINE_REQ_EV_RISING_EDGE)
-                if line.event_wait(seconds, int((timeout - seconds) * 1000000000)):
+                for t in self.events(timeout):
                     callback()
-            except: continue
-            finally:
-                line.release()
-                chip.close()
+            except: self.release()
+
+
+class LoRaIrq:
+    """Long-lived reader of the edge events of a radio interrupt line.
+
+    One thread per radio waits for edges and calls the handler of the current TX, RX or CAD operation,
+    instead of a new thread and line request for every operation. With threaded False no thread is
+    started and the owner calls dispatch(), e.g. when fileno() is readable in selectors or asyncio."""
+
+    # seconds between checks for close() while no edge arrives
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, gpio: LoRaGpio, edge: int = LoRaGpio.EDGE_RISING, threaded: bool = True):
+        self.gpio = gpio
+        self.edge = edge
+        self.threaded = threaded
+        self._handler = None
+        self._continuous = False
+        self._deadline = None
+        self._armTime = 0.0
+        # held while a handler runs so disarm() returns only after it finished
+        self._lock = RLock()
+        self._thread = None
+        self._closed = False
+
+    def arm(self, handler, timeout: Optional[float] = None, continuous: bool = False):
+        # call handler on next edge, or on every edge when continuous, until timeout seconds passed
+        with self._lock:
+            self._handler = handler
+            self._continuous = continuous
+            self._deadline = None if timeout is None else time.monotonic() + timeout
+            self._armTime = time.monotonic()
+            self._closed = False
+        if self.threaded and (self._thread is None or not self._thread.is_alive()):
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def disarm(self):
+        with self._lock:
+            self._handler = None
+        # without monitor thread nobody else drops edges left from previous operation
+        if not self.threaded:
+            self.gpio.clearEvents(self.edge)
+
+    def close(self):
+        # stop monitor thread, before the line itself is closed
+        with self._lock:
+            self._handler = None
+            self._closed = True
+        thread = self._thread
+        if thread is not None and thread is not current_thread():
+            thread.join()
+        self._thread = None
+
+    def fileno(self) -> int:
+        return self.gpio.fileno(self.edge)
+
+    def dispatch(self, timeout: Optional[float] = 0) -> int:
+        # read pending edges, waiting up to timeout seconds (None waits for an edge), and call handler
+        times = self.gpio.waitEvents(timeout, self.edge)
+        with self._lock:
+            for t in times:
+                handler = self._handler
+                if handler is None: break
+                # skip edges from before arm(), kernel timestamps are CLOCK_MONOTONIC
+                if t < self._armTime: continue
+                if self._deadline is not None and time.monotonic() > self._deadline:
+                    self._handler = None
+                    break
+                if not self._continuous: self._handler = None
+                handler()
+        return len(times)
+
+    def _run(self):
+        while not self._closed:
+            try:
+                self.dispatch(self.POLL_INTERVAL)
+            except Exception:
+                # line request lost, it is requested again on next wait
+                self.gpio.release()
+                time.sleep(self.POLL_INTERVAL)
+
+
+class RadioProfile:
+    """LoRa modem and packet settings, written to a radio as a whole with applyProfile()"""
+
+    def __init__(self, frequency: int = 433000000, sf: int = 7, bw: int = 125000, cr: int = 5, ldro: bool = False,
+        headerType: int = 0x00, preambleLength: int = 12, payloadLength: int = 32, crcType: bool = True,
+        syncWord: int = 0x12, rxBoost: bool = True, rxGainLevel: int = 0):
+
+        self.frequency = frequency
+        self.sf = sf
+        self.bw = bw
+        self.cr = cr
+        self.ldro = ldro
+        # header type 0x00 -> explicit, 0x01 -> implicit, same value for SX126x and SX127x
+        self.headerType = headerType
+        self.preambleLength = preambleLength
+        self.payloadLength = payloadLength
+        self.crcType = crcType
+        self.syncWord = syncWord
+        # boosted or power saving LNA gain, gain level 1 - 6 or 0 for AGC (SX127x only)
+        self.rxBoost = rxBoost
+        self.rxGainLevel = rxGainLevel
+
+    def __repr__(self):
+        return "RadioProfile(%d Hz, SF%d, %d Hz, 4/%d, sync word 0x%X)" % (self.frequency, self.sf, self.bw, self.cr, self.syncWord)
 
 
 class BaseLoRa :
@@ -0,0 +1,394 @@
+from .base import LoRaSpi, LoRaGpio
+from collections import deque, namedtuple
+from typing import Iterable, Optional
+import os
+import threading
+import time
+
+# frame waiting in the emulated air until its arrival time
+EmulatedFrame = namedtuple("EmulatedFrame", ["due", "payload", "rssi", "snr", "crcError", "timeout"])
+
+
+class SX127xEmulator :
+    """In-process model of the SX127x LoRa register map and FIFO.
+
+    Plugs in behind EmulatedSpi and EmulatedGpio so the SX127x driver runs unchanged without a radio.
+    Frames, CRC errors and RX timeouts are injected with an arrival delay and delivered while the
+    emulated radio is in a receive mode, at most one per airtime seconds. Every frame due while the
+    radio listens is delivered, so frames which are not read in time are overwritten as on the chip.
+    With dropIdle, frames arriving while the radio does not listen are lost instead of held back.
+    Transmissions complete txTime seconds after entering TX mode. Every SPI transaction and byte is counted.
+    Once edgeFileno() was called, a background thread delivers frames at their arrival time and the
+    returned pipe is readable while DIO0 edges are pending, like the event fd of a gpiod line."""
+
+    # register addresses used by the model
+    REG_FIFO                               = 0x00
+    REG_OP_MODE                            = 0x01
+    REG_FRF_MSB                            = 0x06
+    REG_FRF_MID                            = 0x07
+    REG_FRF_LSB                            = 0x08
+    REG_FIFO_ADDR_PTR                      = 0x0D
+    REG_FIFO_TX_BASE_ADDR                  = 0x0E
+    REG_FIFO_RX_BASE_ADDR                  = 0x0F
+    REG_FIFO_RX_CURRENT_ADDR               = 0x10
+    REG_IRQ_FLAGS_MASK                     = 0x11
+    REG_IRQ_FLAGS                          = 0x12
+    REG_RX_NB_BYTES                        = 0x13
+    REG_PKT_SNR_VALUE                      = 0x19
+    REG_PKT_RSSI_VALUE                     = 0x1A
+    REG_RSSI_VALUE                         = 0x1B
+    REG_PAYLOAD_LENGTH                     = 0x22
+    REG_FIFO_RX_BYTE_ADDR                  = 0x25
+    REG_DIO_MAPPING_1                      = 0x40
+    REG_VERSION                            = 0x42
+
+    # op mode bits
+    LONG_RANGE_MODE                        = 0x80
+    MODE_MASK                              = 0x07
+    MODE_SLEEP                             = 0x00
+    MODE_STDBY                             = 0x01
+    MODE_TX                                = 0x03
+    MODE_RX_CONTINUOUS                     = 0x05
+    MODE_RX_SINGLE                         = 0x06
+
+    # IRQ flags and DIO0 mapping
+    IRQ_TX_DONE                            = 0x08
+    IRQ_HEADER_VALID                       = 0x10
+    IRQ_CRC_ERR                            = 0x20
+    IRQ_RX_DONE                            = 0x40
+    IRQ_RX_TIMEOUT                         = 0x80
+    DIO0_MASK                              = 0xC0
+    DIO0_RX_DONE                           = 0x00
+    DIO0_TX_DONE                           = 0x40
+
+    # RSSI register offsets
+    RSSI_OFFSET_LF                         = 164
+    RSSI_OFFSET_HF                         = 157
+    BAND_THRESHOLD                         = 525E6
+
+    # GPIO roles
+    PIN_CS                                 = "cs"
+    PIN_RESET                              = "reset"
+    PIN_DIO0                               = "dio0"
+
+    # status registers written only by the chip, SPI writes are ignored
+    READ_ONLY_REGISTERS = frozenset((0x10, 0x13, 0x14, 0x15, 0x16, 0x17, 0x18, 0x19, 0x1A, 0x1B, 0x1C,
+        0x25, 0x28, 0x29, 0x2A, 0x2C, 0x3C, 0x42))
+
+    # register values after power on or reset
+    RESET_REGISTERS = {
+        0x01: 0x09, 0x02: 0x1A, 0x03: 0x0B, 0x05: 0x52, 0x06: 0x6C, 0x07: 0x80, 0x09: 0x4F, 0x0A: 0x09,
+        0x0B: 0x2B, 0x0C: 0x20, 0x0E: 0x80, 0x1D: 0x72, 0x1E: 0x70, 0x1F: 0x64, 0x21: 0x08, 0x22: 0x01,
+        0x23: 0xFF, 0x26: 0x04, 0x31: 0xC3, 0x33: 0x27, 0x37: 0x0A, 0x39: 0x12, 0x3B: 0x1D, 0x4B: 0x09,
+        0x4D: 0x84, 0x61: 0x13, 0x62: 0x0E, 0x63: 0x5B, 0x64: 0xDB, 0x70: 0xD0
+    }
+
+    def __init__(self, version: int = 0x12, txTime: float = 0.001, airtime: float = 0.0, dropIdle: bool = False) :
+
+        self.version = version
+        self.txTime = txTime
+        self.airtime = airtime
+        self.dropIdle = dropIdle
+        self.registers = bytearray(128)
+        self.fifo = bytearray(256)
+        # transmitted payloads, oldest first
+        self.transmitted = []
+        # transaction counters
+        self.transactions = 0
+        self.bytesTransferred = 0
+        self.gpioWrites = 0
+        self.framesDelivered = 0
+        self.framesMissed = 0
+        self._frames = deque()
+        self._edges = deque()
+        self._rxWritePtr = 0
+        self._txDue = None
+        self._resetLevel = LoRaGpio.HIGH
+        self._condition = threading.Condition()
+        self._edgePipe = None
+        self.reset()
+
+### EMULATOR CONTROL ###
+
+    def reset(self) :
+
+        with self._condition :
+            self.registers[:] = bytes(128)
+            for address, value in self.RESET_REGISTERS.items() :
+                self.registers[address] = value
+            self.registers[self.REG_VERSION] = self.version
+            self._edges.clear()
+            self._drainPipe()
+            self._rxWritePtr = 0
+            self._txDue = None
+
+    def resetCounters(self) :
+
+        self.transactions = 0
+        self.bytesTransferred = 0
+        self.gpioWrites = 0
+        self.framesDelivered = 0
+        self.framesMissed = 0
+
+    def inject(self, payload, rssi: float = -60, snr: float = 8.0, crcError: bool = False, delay: float = 0.0) :
+
+        # schedule a frame arriving delay seconds from now, or one airtime after the previous scheduled frame
+        with self._condition :
+            due = time.monotonic() + delay
+            if self._frames : due = max(due, self._frames[-1].due + self.airtime)
+            self._frames.append(EmulatedFrame(due, bytes(payload), rssi, snr, crcError, False))
+            self._condition.notify_all()
+
+    def injectTimeout(self, delay: float = 0.0) :
+
+        # schedule an RX timeout, only signalled in RX single mode
+        with self._condition :
+            due = time.monotonic() + delay
+            if self._frames : due = max(due, self._frames[-1].due + self.airtime)
+            self._frames.append(EmulatedFrame(due, b"", 0, 0.0, False, True))
+            self._condition.notify_all()
+
+    def pending(self) -> int :
+
+        return len(self._frames)
+
+    def spi(self, hardwareCs: bool = True) :
+
+        return EmulatedSpi(self, hardwareCs=hardwareCs)
+
+    def gpio(self, role: str) :
+
+        return EmulatedGpio(self, role)
+
+### SPI AND GPIO SIDE ###
+
+    def transfer(self, buf: Iterable) -> list :
+
+        buf = list(buf)
+        with self._condition :
+            self.transactions += 1
+            self.bytesTransferred += len(buf)
+            self._deliver()
+            address = buf[0] & 0x7F
+            write = bool(buf[0] & 0x80)
+            feedback = [0x00]
+            for data in buf[1:] :
+                if address == self.REG_FIFO :
+                    pointer = self.registers[self.REG_FIFO_ADDR_PTR]
+                    if write : self.fifo[pointer] = data & 0xFF
+                    feedback.append(self.fifo[pointer])
+                    self.registers[self.REG_FIFO_ADDR_PTR] = (pointer + 1) & 0xFF
+                    continue
+                if write : self._writeRegister(address, data & 0xFF)
+                feedback.append(self.registers[address])
+                # burst access auto increments register address
+                address = (address + 1) & 0x7F
+            self._deliver()
+            return feedback
+
+    def setPin(self, role: str, value: int) :
+
+        with self._condition :
+            self.gpioWrites += 1
+            # rising edge on reset pin restarts the chip
+            if role == self.PIN_RESET :
+                if value and not self._resetLevel : self.reset()
+                self._resetLevel = value
+
+    def waitEdges(self, timeout: Optional[float]) -> list :
+
+        # block until DIO0 rises or timeout reached, deliver due frames while waiting
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition :
+            while True :
+                self._deliver()
+                if self._edges :
+                    edges = list(self._edges)
+                    self._edges.clear()
+                    self._drainPipe()
+                    return edges
+                now = time.monotonic()
+                wake = deadline
+                due = self._nextDue()
+                if due is not None :
+                    wake = due if wake is None else min(wake, due)
+                if deadline is not None and now >= deadline : return []
+                self._condition.wait(None if wake is None else max(0.0, wake - now))
+
+    def clearEdges(self) :
+
+        with self._condition :
+            self._edges.clear()
+            self._drainPipe()
+
+    def edgeFileno(self) -> int :
+
+        with self._condition :
+            if self._edgePipe is None :
+                self._edgePipe = os.pipe()
+                os.set_blocking(self._edgePipe[0], False)
+                if self._edges : os.write(self._edgePipe[1], b"\x01")
+                threading.Thread(target=self._air, daemon=True).start()
+            return self._edgePipe[0]
+
+    def _air(self) :
+
+        # deliver frames and finish transmissions at their due time without waiting for SPI access
+        with self._condition :
+            while True :
+                self._deliver()
+                due = self._nextDue()
+                self._condition.wait(None if due is None else max(0.0, due - time.monotonic()))
+
+    def _drainPipe(self) :
+
+        if self._edgePipe is None : return
+        try :
+            while os.read(self._edgePipe[0], 4096) : pass
+        except BlockingIOError :
+            pass
+
+### REGISTER MODEL ###
+
+    def _writeRegister(self, address: int, data: int) :
+
+        if address == self.REG_IRQ_FLAGS :
+            # IRQ flags are cleared by writing 1
+            self.registers[address] &= ~data & 0xFF
+            return
+        if address in self.READ_ONLY_REGISTERS : return
+        self.registers[address] = data
+        if address == self.REG_OP_MODE :
+            mode = data & self.MODE_MASK
+            if mode in (self.MODE_RX_CONTINUOUS, self.MODE_RX_SINGLE) :
+                self._rxWritePtr = self.registers[self.REG_FIFO_RX_BASE_ADDR]
+                self._condition.notify_all()
+            elif mode == self.MODE_TX :
+                self._txDue = time.monotonic() + self.txTime
+                self._condition.notify_all()
+            else :
+                self._txDue = None
+
+    def _mode(self) -> int :
+
+        return self.registers[self.REG_OP_MODE] & self.MODE_MASK
+
+    def _receiving(self) -> bool :
+
+        return self.registers[self.REG_OP_MODE] & self.LONG_RANGE_MODE and \
+            self._mode() in (self.MODE_RX_CONTINUOUS, self.MODE_RX_SINGLE)
+
+    def _rssiOffset(self) -> int :
+
+        frf = (self.registers[self.REG_FRF_MSB] << 16) | (self.registers[self.REG_FRF_MID] << 8) | self.registers[self.REG_FRF_LSB]
+        if self.version == 0x22 : return 139
+        return self.RSSI_OFFSET_LF if frf * 32000000 / (1 << 19) < self.BAND_THRESHOLD else self.RSSI_OFFSET_HF
+
+    def _raise(self, dio0: int, irq: int) :
+
+        # set IRQ flags and rise DIO0 when it is mapped to this interrupt
+        self.registers[self.REG_IRQ_FLAGS] |= irq
+        if self.registers[self.REG_DIO_MAPPING_1] & self.DIO0_MASK == dio0 :
+            self._edges.append(time.monotonic())
+            if self._edgePipe is not None : os.write(self._edgePipe[1], b"\x01")
+            self._condition.notify_all()
+
+    def _nextDue(self) -> Optional[float] :
+
+        if self._txDue is not None : return self._txDue
+        if self._frames and self._receiving() : return self._frames[0].due
+        return None
+
+    def _deliver(self) :
+
+        # finish transmission and move every frame due by now into the FIFO while in receive mode
+        now = time.monotonic()
+        if self._txDue is not None and self._txDue <= now :
+            self._txDue = None
+            self._transmit()
+        while self._frames and self._frames[0].due <= now :
+            if not self._receiving() :
+                if not self.dropIdle : break
+                self._frames.popleft()
+                self.framesMissed += 1
+                continue
+            frame = self._frames.popleft()
+            single = self._mode() == self.MODE_RX_SINGLE
+            if frame.timeout :
+                if single :
+                    self.registers[self.REG_OP_MODE] = (self.registers[self.REG_OP_MODE] & ~self.MODE_MASK) | self.MODE_STDBY
+                    self.registers[self.REG_IRQ_FLAGS] |= self.IRQ_RX_TIMEOUT
+                continue
+            start = self._rxWritePtr
+            for i, data in enumerate(frame.payload) :
+                self.fifo[(start + i) & 0xFF] = data
+            self._rxWritePtr = (start + len(frame.payload)) & 0xFF
+            self.registers[self.REG_FIFO_RX_CURRENT_ADDR] = start
+            self.registers[self.REG_FIFO_RX_BYTE_ADDR] = self._rxWritePtr
+            self.registers[self.REG_RX_NB_BYTES] = len(frame.payload) & 0xFF
+            self.registers[self.REG_PKT_RSSI_VALUE] = max(0, min(255, int(round(frame.rssi)) + self._rssiOffset()))
+            self.registers[self.REG_PKT_SNR_VALUE] = int(round(frame.snr * 4)) & 0xFF
+            self.framesDelivered += 1
+            irq = self.IRQ_RX_DONE | self.IRQ_HEADER_VALID
+            if frame.crcError : irq |= self.IRQ_CRC_ERR
+            if single :
+                self.registers[self.REG_OP_MODE] = (self.registers[self.REG_OP_MODE] & ~self.MODE_MASK) | self.MODE_STDBY
+            self._raise(self.DIO0_RX_DONE, irq)
+
+    def _transmit(self) :
+
+        # payload is taken from TX base address
+        start = self.registers[self.REG_FIFO_TX_BASE_ADDR]
+        length = self.registers[self.REG_PAYLOAD_LENGTH]
+        self.transmitted.append(bytes(self.fifo[(start + i) & 0xFF] for i in range(length)))
+        self.registers[self.REG_OP_MODE] = (self.registers[self.REG_OP_MODE] & ~self.MODE_MASK) | self.MODE_STDBY
+        self._raise(self.DIO0_TX_DONE, self.IRQ_TX_DONE)
+
+
+class EmulatedSpi(LoRaSpi):
+
+    def __init__(self, emulator: SX127xEmulator, speed: int = LoRaSpi.SPI_SPEED, hardwareCs: bool = True):
+        super().__init__(0, 0, speed, hardwareCs)
+        self.emulator = emulator
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def transfer(self, buf: Iterable) -> list:
+        return self.emulator.transfer(buf)
+
+
+class EmulatedGpio(LoRaGpio):
+
+    def __init__(self, emulator: SX127xEmulator, role: str):
+        super().__init__(0, 0)
+        self.emulator = emulator
+        self.role = role
+        self._value = LoRaGpio.HIGH
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+    def output(self, value: int):
+        self._value = value
+        self.emulator.setPin(self.role, value)
+
+    def input(self) -> int:
+        return self._value
+
+    def waitEvents(self, timeout: Optional[float], edge: int = LoRaGpio.EDGE_RISING) -> list:
+        times = self.emulator.waitEdges(timeout)
+        if times: self.eventTime = times[-1]
+        return times
+
+    def clearEvents(self, edge: int = LoRaGpio.EDGE_RISING):
+        self.emulator.clearEdges()
+
+    def fileno(self, edge: int = LoRaGpio.EDGE_RISING) -> int:
+        return self.emulator.edgeFileno()
@@ -0,0 +1,185 @@
+from .SX127x import SX127x
+from collections import namedtuple
+from typing import Optional
+import struct
+import time
+
+# Trace file layout, all little endian:
+#   file header : magic "LRTR", format version, 3 padding bytes
+#   record      : timestamp (float64, epoch seconds), packet RSSI (int16, dBm), raw SNR (int8, SNR * 4),
+#                 IRQ flags (uint8), payload length (uint8), followed by the payload bytes
+TRACE_MAGIC = b"LRTR"
+TRACE_VERSION = 1
+TRACE_HEADER = struct.Struct("<4sB3x")
+TRACE_RECORD = struct.Struct("<dhbBB")
+
+TraceFrame = namedtuple("TraceFrame", ["timestamp", "rssi", "snr", "irq", "payload"])
+
+
+class TraceWriter:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "ab")
+        # new or empty file starts with file header
+        if self._file.tell() == 0:
+            self._file.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION))
+            self._file.flush()
+
+    def write(self, payload, rssi: float, snr: float, irq: int, timestamp: Optional[float] = None):
+        if timestamp is None: timestamp = time.time()
+        rssi = max(-32768, min(32767, int(rssi)))
+        snr = max(-128, min(127, int(round(snr * 4))))
+        self._file.write(TRACE_RECORD.pack(timestamp, rssi, snr, irq & 0xFF, len(payload)))
+        self._file.write(bytes(payload))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def readTrace(path: str) -> list:
+
+    # read all frames of a trace file
+    frames = []
+    with open(path, "rb") as f:
+        magic, version = TRACE_HEADER.unpack(f.read(TRACE_HEADER.size))
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise ValueError("not a LoRa trace file: " + path)
+        while True:
+            record = f.read(TRACE_RECORD.size)
+            if len(record) < TRACE_RECORD.size: break
+            timestamp, rssi, snr, irq, length = TRACE_RECORD.unpack(record)
+            payload = f.read(length)
+            if len(payload) < length: break
+            frames.append(TraceFrame(timestamp, rssi, snr / 4.0, irq, payload))
+    return frames
+
+
+class SX127xReplay(SX127x) :
+    """Drop-in stand-in for SX127x which replays frames from a trace file instead of a radio.
+
+    Frames are delivered at the recorded speed when realtime is True, otherwise as fast as requested.
+    Register writes are ignored and register reads answer as an idle SX1276 in LoRa mode, so
+    configuration methods can be called as for the real radio."""
+
+    def __init__(self, path: str, realtime: bool = False, loop: bool = False, frames: Optional[list] = None) :
+
+        super().__init__(None, None, None)
+        self._frames = frames if frames is not None else readTrace(path)
+        self._realtime = realtime
+        self._loop = loop
+        self._index = 0
+        self._frame = None
+        self._payload = b""
+        self._offset = 0
+        self._startTime = 0.0
+        self._startStamp = 0.0
+        self.finished = not self._frames
+
+    def begin(self) -> bool :
+
+        return True
+
+    def reset(self) -> bool :
+
+        return True
+
+    def request(self, timeout: int = 0) -> bool :
+
+        self._statusWait = self.STATUS_RX_CONTINUOUS if timeout == self.RX_CONTINUOUS else self.STATUS_RX_WAIT
+        self._statusIrq = 0x00
+        return True
+
+    def wait(self, timeout: int = 0) -> bool :
+
+        # immediately return when frame already delivered and not yet requested again
+        if self._statusIrq : return True
+        if self._index >= len(self._frames) :
+            if not self._loop or not self._frames :
+                self.finished = True
+                return False
+            self._index = 0
+            self._startTime = 0.0
+        frame = self._frames[self._index]
+
+        # sleep until frame is due relative to first replayed frame
+        if self._realtime :
+            if not self._startTime :
+                self._startTime = time.monotonic()
+                self._startStamp = frame.timestamp
+            delay = self._startTime + (frame.timestamp - self._startStamp) - time.monotonic()
+            if timeout > 0 and delay > timeout :
+                time.sleep(timeout)
+                return False
+            if delay > 0 : time.sleep(delay)
+
+        self._index += 1
+        self._frame = frame
+        self._payload = frame.payload
+        self._offset = 0
+        self._payloadTxRx = len(frame.payload)
+        self._statusIrq = frame.irq if frame.irq else self.IRQ_RX_DONE
+        return True
+
+    def read(self, length: int = 0) :
+
+        single = length == 0
+        data = tuple(self._take(1 if single else length))
+        if single : return data[0] if data else 0
+        return data
+
+    def get(self, length: int = 1) -> bytes :
+
+        return bytes(self._take(length))
+
+    def readInto(self, buffer, length: int = 0) -> int :
+
+        if length == 0 or length > self._payloadTxRx : length = self._payloadTxRx
+        if length > len(buffer) : length = len(buffer)
+        buffer[:length] = self._take(length)
+        return length
+
+    def _take(self, length: int) -> bytes :
+
+        data = self._payload[self._offset:self._offset + length]
+        self._offset += len(data)
+        self._payloadTxRx = max(0, self._payloadTxRx - length)
+        return data
+
+    def applyProfile(self, profile, verify: bool = True) -> bool :
+
+        return True
+
+    def irqStatus(self) -> int :
+
+        return self._statusIrq
+
+    def packetRssi(self) -> float :
+
+        return self._frame.rssi if self._frame else 0
+
+    def rssi(self) -> float :
+
+        return self.packetRssi()
+
+    def snr(self) -> float :
+
+        return self._frame.snr if self._frame else 0.0
+
+    def _transfer(self, address: int, data: int) -> int :
+
+        # answer as idle SX1276 in LoRa mode, ignore writes
+        if address == self.REG_VERSION : return 0x12
+        if address == self.REG_OP_MODE : return self.LONG_RANGE_MODE | self.MODE_STDBY
+        return 0x00
+
+    def _transferBurst(self, address: int, data: list) -> list :
+
+        return [0x00] * len(data)
@@ -38,18 +38,19 @@ __maintainer__ = "developer"
 __status__ = "Production"
 __version__ = "1"
 
+import collections
 import logging  # This supports the new WeeWX 4.x logging methodology
 import math
-import os
-import sys
+import struct
+import threading
 import time
-import numpy as np
 
 import weewx.drivers
+from weeutil.weeutil import to_bool, to_int, to_float
 # sys.path.insert(1, '/etc/weewx/bin/user') # Alternate path to place the LoRaRF folder
 # LoRaRF can also be placed in /usr/share/weewx/
 # It should read this from [/etc/weewx/bin]/user/LoRaRF
-from .LoRaRF import SX127x, LoRaSpi, LoRaGpio
+from .LoRaRF import SX127x, SX127xReplay, TraceWriter, LoRaSpi, LoRaGpio, RadioProfile
 
 DRIVER_NAME = "BYOWS_LORA"
 DRIVER_VERSION = "1"
@@ -57,8 +58,71 @@ DRIVER_VERSION = "1"
 # Initialize the logger for this module
 log = logging.getLogger(__name__)
 
+# Define the data packet size we expect to receive.
+# This will be used to check against junk packets and discard them to
+# Adjust the expected packet size depending on the data being received.
+# For BME280 sensor values, we expect 15 payload lengths for data and 1 for header.
+EXPECTED_DATA_LENGTH = 15
+# Newer Pico firmware appends the wind counting interval, see FRAME_INTERVAL_STRUCT
+INTERVAL_DATA_LENGTH = 17
+
+# Longest single wait in seconds, so that the receiver thread notices a stop request and genLoopPackets
+# a stopped receiver quickly
+WAIT_SLICE = 0.5
+
+""" Packet structure
+Example:
+[(1)1,  (2)0, (3)24,    (4)0, (5)81,    (6)3, (7)112,   (8)0, (9)69,    (10)0, (11)66,  (12)0, (13)90,
+(14)3,  (15)5,  (16)12]]
+[(1)packet header#,    (2)byte_array, (3)temp_d1,      (4)byte_array, (5)temp_d2,
+(6)byte_array, (7)pressure_d1,      (8)byte_array, (9)pressure_d2,      (10)byte_array, (11)humidity_d1,
+(12)byte_array, (13)humidity_d2,    (14)rainfall(bucket tips),          (15)windcount (Anemometer rotations),
+(16)windDir (Wind vane) ]
+The header is an unsigned byte, each byte_array/value pair is a big endian signed 16 bit integer
+and the last three values are unsigned bytes.
+Newer Pico firmware adds (17)(18) the milliseconds over which the wind and rain were counted as a big endian
+unsigned 16 bit integer. Frames without it are still accepted.
+"""
+FRAME_STRUCT = struct.Struct(">B6h3B")
+FRAME_INTERVAL_STRUCT = struct.Struct(">B6h3BH")
+
+# Decoded frame. interval is the sender's counting interval in seconds, None for frames without it
+Reading = collections.namedtuple("Reading", ["header", "temperature", "pressure", "humidity",
+                                             "bucket_tips", "wind_count", "wind_vane", "interval"])
+
+# Packet status of a received frame, read from the radio once per frame
+PacketStatus = collections.namedtuple("PacketStatus", ["rssi", "snr", "irq_flags", "status"])
+
 # Setting up the possible range of RSSI values as per local testing and https://lora.readthedocs.io/en/latest/
-RSSI_range = np.arange(-45, -121, -1)
+RSSI_MIN = -120
+RSSI_MAX = -45
+# Signal strength percentage for RSSI_MIN + index: the share of the RSSI range that is below that RSSI
+RSSI_COUNT = RSSI_MAX - RSSI_MIN + 1
+RSSI_PERCENT = tuple(below / RSSI_COUNT * 100 for below in range(RSSI_COUNT + 1))
+
+
+# The Pico sends the 10 bit wind vane reading divided by 4 to fit it in a byte
+VANE_SCALE = 4
+
+# Wind vane calibration: direction in degrees, lowest and highest 10 bit reading for that direction
+DEFAULT_VANE_CALIBRATION = (
+    (112.5, 876, 900),
+    (67.5, 867, 875),
+    (90.0, 846, 866),
+    (157.5, 6, 7),
+    (135.0, 690, 710),
+    (202.5, 8, 9),
+    (180.0, 560, 580),
+    (22.5, 430, 436),
+    (45.0, 370, 390),
+    (247.5, 10, 11),
+    (225.0, 230, 250),
+    (337.5, 180, 200),
+    (0.0, 130, 140),
+    (292.5, 100, 120),
+    (315.0, 70, 90),
+    (270.0, 40, 60),
+)
 
 
 def loader(config_dict, _):
@@ -78,28 +142,248 @@ class ByowsRpi(weewx.drivers.AbstractDevice):
 
     def __init__(self, **stn_dict):
         self.hardware = stn_dict.get("hardware", "BYOWS - Raspberry Pi")
-        self.loop_interval = float(stn_dict.get("loop_interval", 5))
+        # Minimum seconds between loop packets. Readings arriving sooner are coalesced into the next packet
+        self.loop_interval = to_float(stn_dict.get("loop_interval", 0))
         params = dict()
+        params["spi_hardware_cs"] = to_bool(stn_dict.get("spi_hardware_cs", True))
+        for key in ("spi_bus", "spi_cs", "gpio_chip", "cs_pin", "reset_pin", "irq_pin"):
+            if key in stn_dict:
+                params[key] = to_int(stn_dict[key])
+        if "wind_vane" in stn_dict:
+            params["vane_calibration"] = vane_calibration_from_config(stn_dict["wind_vane"])
+        params["accept_single_copy"] = to_bool(stn_dict.get("accept_single_copy", True))
+        params["dedup_window"] = to_int(stn_dict.get("dedup_window", 8))
+        params["dedup_hold"] = to_float(stn_dict.get("dedup_hold", 1.0))
+        params["link_stats_alpha"] = to_float(stn_dict.get("link_stats_alpha", 0.1))
+        params["link_stats_log_interval"] = to_float(stn_dict.get("link_stats_log_interval", 3600))
+        params["vane_snap"] = to_bool(stn_dict.get("wind_vane_snap", False))
+        params["register_cache"] = to_bool(stn_dict.get("register_cache", False))
+        params["radio_profile"] = radio_profile_from_config(stn_dict)
+        params["rx_continuous"] = to_bool(stn_dict.get("rx_continuous", True))
+        params["rx_timeout"] = to_float(stn_dict.get("rx_timeout", 60))
+        params["watchdog_timeouts"] = to_int(stn_dict.get("watchdog_timeouts", 5))
+        params["watchdog_crc_errors"] = to_int(stn_dict.get("watchdog_crc_errors", 10))
+        for key in ("trace_file", "replay_file", "replay_speed"):
+            if key in stn_dict:
+                params[key] = stn_dict[key]
+        # Per stage latency instrumentation, off unless latency_stats is set
+        self.timer = None
+        if to_bool(stn_dict.get("latency_stats", False)):
+            self.timer = StageTimer(to_int(stn_dict.get("latency_window", 256)),
+                                    to_int(stn_dict.get("latency_log_every", 100)),
+                                    to_bool(stn_dict.get("latency_fields", False)))
+            params["timer"] = self.timer
         log.info("using driver %s" % DRIVER_NAME)
         log.info("driver version is %s" % DRIVER_VERSION)
         self.station = ByowsRpiStation(**params)
+        self.queue = PacketQueue(to_int(stn_dict.get("queue_size", 8)),
+                                 stn_dict.get("queue_overflow", PacketQueue.DROP_OLDEST))
+        self.receiver = None
 
     @property
     def hardware_name(self):
         return self.hardware
 
+    def start_receiver(self):
+        """ Start the background receiver thread if it isn't running yet. """
+        if self.receiver is None or not self.receiver.is_alive():
+            self.station.stopping.clear()
+            self.receiver = ByowsRpiReceiver(self.station, self.queue)
+            self.receiver.start()
+
+    def closePort(self):
+        # The receiver thread must be done with the radio before the radio is closed
+        if self.receiver is not None:
+            self.receiver.stop()
+            self.receiver.join(WAIT_SLICE * 10)
+            if self.receiver.is_alive():
+                log.error("LoRa receiver thread did not stop")
+            self.receiver = None
+        self.station.close_radio()
+        self.station.close_trace()
+
     def genLoopPackets(self):
-        """ Function that generates packets for weeWX by looping through station
-        data generator function. """
+        """ Function that generates packets for weeWX from the readings queued by
+        the receiver thread. A packet is yielded as soon as a reading arrives, stamped with
+        the time its frame was received. With loop_interval set, packets are at least
+        loop_interval seconds apart and readings arriving in between are coalesced. Ends once the receiver
+        thread stopped, at the end of a replayed trace, and every queued reading was yielded. """
+        self.start_receiver()
+        receiver = self.receiver
+        timer = self.timer
+        next_packet = 0.0
         while True:
+            data = self.next_reading(receiver)
+            if data is None:
+                log.info("LoRa receiver stopped, no more loop packets")
+                return
+            if self.loop_interval > 0:
+                remaining = next_packet - time.monotonic()
+                while remaining > 0:
+                    newer = self.next_reading(receiver, remaining)
+                    if newer is None:
+                        break
+                    data = coalesce_data(data, newer, PacketQueue.ACCUMULATED_FIELDS)
+                    remaining = next_packet - time.monotonic()
+                next_packet = time.monotonic() + self.loop_interval
             packet = {"dateTime": int(time.time() + 0.5), "usUnits": weewx.METRIC}
-            data = self.station.get_data()
-            if data is not None:
-                packet.update(data)
+            packet.update(data)
+            if timer is not None:
+                received = packet.pop("_received", None)
+                start = time.monotonic()
+                if received is not None:
+                    timer.add("queue", start - received)
+                packet.update(timer.fields())
                 yield packet
-                time.sleep(self.loop_interval)  # defaults to 5 seconds
+                timer.add("weewx", time.monotonic() - start)
+                if timer.packet_done():
+                    log.info("Stage latency: %s", timer.summary())
             else:
+                yield packet
+
+
+    def next_reading(self, receiver, timeout=None):
+        """ Returns the next queued reading, waiting at most timeout seconds (None waits as long as the
+        receiver runs). Returns None on timeout or once the receiver stopped and the queue is empty. """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = WAIT_SLICE
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return None
+            data = self.queue.get(wait)
+            if data is not None:
+                return data
+            if not receiver.is_alive() and not len(self.queue):
+                return None
+
+
+class PacketQueue(object):
+    """ Bounded queue of decoded readings between the receiver thread and genLoopPackets.
+
+    When the queue is full the overflow policy decides what happens to the new reading:
+    drop_oldest discards the oldest queued reading, coalesce merges the new reading into
+    the newest queued one so that no rain or wind counts are lost. """
+
+    DROP_OLDEST = "drop_oldest"
+    COALESCE = "coalesce"
+
+    # Fields that count events since the previous reading and must be added up when coalescing
+    ACCUMULATED_FIELDS = ("rain", "anemRotations", "timeAnemInterval")
+
+    def __init__(self, maxsize=8, overflow=DROP_OLDEST):
+        if overflow not in (self.DROP_OLDEST, self.COALESCE):
+            raise ValueError("Unknown queue overflow policy: %s" % overflow)
+        self.maxsize = max(1, maxsize)
+        self.overflow = overflow
+        self.dropped = 0
+        self.coalesced = 0
+        self._items = collections.deque()
+        self._ready = threading.Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, data):
+        with self._ready:
+            if len(self._items) >= self.maxsize:
+                if self.overflow == self.COALESCE:
+                    self._items[-1] = coalesce_data(self._items[-1], data, self.ACCUMULATED_FIELDS)
+                    self.coalesced += 1
+                    return
+                self._items.popleft()
+                self.dropped += 1
+                log.debug("Packet queue full. Dropped the oldest reading (%d dropped so far)", self.dropped)
+            self._items.append(data)
+            self._ready.notify()
+
+    def get(self, timeout=None):
+        """ Returns the oldest queued reading, waiting for one if the queue is empty.
+        Returns None if nothing arrived within timeout seconds. """
+        with self._ready:
+            if not self._ready.wait_for(lambda: self._items, timeout):
+                return None
+            return self._items.popleft()
+
+
+def coalesce_data(older, newer, accumulated_fields):
+    """ Merge two readings: instantaneous values come from the newer reading and
+    counters are added up. The wind speed is recomputed over the merged interval. """
+    data = dict(older)
+    data.update(newer)
+    for field in accumulated_fields:
+        if older.get(field) is not None and newer.get(field) is not None:
+            data[field] = older[field] + newer[field]
+    # Speed times interval is proportional to the anemometer rotations, so the interval weighted mean is the
+    # speed of the summed rotations over the summed interval
+    speeds = (older.get("windSpeed"), newer.get("windSpeed"))
+    intervals = (older.get("timeAnemInterval"), newer.get("timeAnemInterval"))
+    if None not in speeds and None not in intervals and sum(intervals) > 0:
+        data["windSpeed"] = (speeds[0] * intervals[0] + speeds[1] * intervals[1]) / sum(intervals)
+    return data
+
+
+class ByowsRpiReceiver(threading.Thread):
+    """ Thread that keeps the radio listening and queues every decoded reading, so that
+    the radio is never deaf while weeWX processes a packet. """
+
+    def __init__(self, station, queue):
+        super(ByowsRpiReceiver, self).__init__(name="byows-lora-receiver")
+        self.daemon = True
+        self.station = station
+        self.queue = queue
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        # Interrupts a receive wait of the station
+        self.station.stopping.set()
+
+    def run(self):
+        log.info("LoRa receiver thread started")
+        while self.running and not self.station.finished:
+            try:
+                data = self.station.get_data()
+            except Exception as exc:
+                log.error("Receiver error: %s", exc)
+                # Close the radio session so that it is re-initialised on the next reading
+                self.station.close_radio()
+                self.station.stopping.wait(1)
                 continue
+            if data is not None:
+                self.queue.put(data)
+        log.info("LoRa receiver thread stopped")
+
+
+def join_decimal(integer, decimal):
+    """ Joins the integer part and the two digit decimal part sent by the Pico into a float.
+    The sign is carried by whichever part is negative, so -0.50 arrives as 0 and -50. """
+    value = (abs(integer) * 100 + abs(decimal)) / 100.0
+    return -value if integer < 0 or decimal < 0 else value
+
+
+def decode_frame(frame):
+    """ Decodes a frame (bytes, bytearray or memoryview) into a Reading in a single unpack. """
+    if len(frame) >= FRAME_INTERVAL_STRUCT.size:
+        header, t1, t2, p1, p2, h1, h2, bucket_tips, wind_count, wind_vane, interval_ms = \
+            FRAME_INTERVAL_STRUCT.unpack_from(frame)
+        interval = interval_ms / 1000.0
+    else:
+        header, t1, t2, p1, p2, h1, h2, bucket_tips, wind_count, wind_vane = FRAME_STRUCT.unpack_from(frame)
+        interval = None
+    return Reading(header, join_decimal(t1, t2), join_decimal(p1, p2), join_decimal(h1, h2),
+                   bucket_tips, wind_count, wind_vane, interval)
+
+
+def signal_percent(rssi):
+    """ Returns the signal strength as the percentage of the RSSI range below rssi. """
+    index = math.ceil(rssi) - RSSI_MIN
+    if index <= 0:
+        return 0.0
+    if index >= RSSI_COUNT:
+        return 100.0
+    return RSSI_PERCENT[index]
 
 
 def get_rainfall(bucket_tips):
@@ -109,59 +393,422 @@ def get_rainfall(bucket_tips):
     return rainfall
 
 
-def read_direction(wind_dir):
-    reading = wind_dir * 4
-    if 876 <= reading <= 900:
-        s = 112.5
-    elif 867 <= reading <= 875:
-        s = 67.5
-    elif 846 <= reading <= 866:
-        s = 90.0
-    elif 6 <= reading <= 7:
-        s = 157.5
-    elif 690 <= reading <= 710:
-        s = 135.0
-    elif 8 <= reading <= 9:
-        s = 202.5
-    elif 560 <= reading <= 580:
-        s = 180.0
-    elif 430 <= reading <= 436:
-        s = 22.5
-    elif 370 <= reading <= 390:
-        s = 45.0
-    elif 10 <= reading <= 11:
-        s = 247.5
-    elif 230 <= reading <= 250:
-        s = 225.0
-    elif 180 <= reading <= 200:
-        s = 337.5
-    elif 130 <= reading <= 140:
-        s = 0.0
-    elif 100 <= reading <= 120:
-        s = 292.5
-    elif 70 <= reading <= 90:
-        s = 315.0
-    elif 40 <= reading <= 60:
-        s = 270.0
-    else:
-        log.debug("Unknown Wind Vane value: %s" % str(reading))
-        return None
+def build_vane_table(calibration, snap=False):
+    """ Builds the lookup table that maps every raw vane byte to a wind direction in degrees.
+
+    calibration is a list of (direction, lowest reading, highest reading), where the reading is the raw
+    byte multiplied by VANE_SCALE. Bytes outside every range map to None, or to the direction of the
+    nearest range when snap is set. """
+    table = []
+    for raw in range(256):
+        reading = raw * VANE_SCALE
+        direction = None
+        for degrees, low, high in calibration:
+            if low <= reading <= high:
+                direction = degrees
+                break
+        if direction is None and snap and calibration:
+            direction = min(calibration, key=lambda c: max(c[1] - reading, reading - c[2]))[0]
+        table.append(direction)
+    return tuple(table)
+
+
+def vane_calibration_from_config(section):
+    """ Reads the [[wind_vane]] calibration from weewx.conf: direction = lowest reading, highest reading """
+    calibration = []
+    for degrees, (low, high) in section.items():
+        calibration.append((float(degrees), int(low), int(high)))
+    return calibration
+
+
+DEFAULT_VANE_TABLE = build_vane_table(DEFAULT_VANE_CALIBRATION)
+
+
+def radio_profile_from_config(stn_dict):
+    """ Builds the LoRa RadioProfile from the [BYOWS_LORA] options. The defaults match the Pico sender. """
+    return RadioProfile(
+        frequency=to_int(stn_dict.get("frequency", 433000000)),
+        sf=to_int(stn_dict.get("spreading_factor", 7)),
+        bw=to_int(stn_dict.get("bandwidth", 125000)),
+        cr=to_int(stn_dict.get("coding_rate", 5)),
+        ldro=to_bool(stn_dict.get("low_data_rate_optimize", False)),
+        headerType=SX127x.HEADER_IMPLICIT if str(stn_dict.get("header_type", "explicit")).lower() == "implicit"
+        else SX127x.HEADER_EXPLICIT,
+        preambleLength=to_int(stn_dict.get("preamble_length", 12)),
+        # The expected data + 1 for header
+        payloadLength=to_int(stn_dict.get("payload_length", EXPECTED_DATA_LENGTH + 1)),
+        crcType=to_bool(stn_dict.get("crc", True)),
+        # Others that work are 0x10, 0x15, 0x13 as per the sender's configuration
+        syncWord=int(str(stn_dict.get("sync_word", "0x14")), 0),
+        rxBoost=str(stn_dict.get("rx_gain", "power_saving")).lower() == "boosted",
+        rxGainLevel=SX127x.RX_GAIN_AUTO)
+
+
+def read_direction(wind_dir, vane_table=DEFAULT_VANE_TABLE):
+    s = vane_table[wind_dir]
+    if s is None:
+        log.debug("Unknown Wind Vane value: %s", wind_dir * VANE_SCALE)
     return s
 
 
+class DuplicateMatcher(object):
+    """ Pairs the two copies of every reading sent by the Pico.
+
+    The Pico sends each reading twice, with consecutive one byte headers: an odd header and then
+    header + 1, which wraps from 255 to 0. Copies are keyed on the odd header so they pair in any order.
+    A reading is released when both copies agree, or from a single CRC clean copy once its partner is
+    clearly not coming: a frame of another reading arrived or the copy has been held for hold seconds.
+    Released keys are remembered in a small window so that late copies are dropped as duplicates.
+    Every copy carries the packet status it was received with, a reading is released as the chosen
+    copy's (frame, status). """
+
+    def __init__(self, window=8, accept_single=True, hold=1.0, stats=None):
+        self.accept_single = accept_single
+        self.hold = hold
+        self.stats = stats if stats is not None else LinkStats()
+        self.pending = collections.OrderedDict()  # key -> (frame, crc_ok, time received, status)
+        self.released = collections.deque(maxlen=max(1, window))
+
+    @staticmethod
+    def key(header):
+        """ Returns the header of the first (odd) copy of a reading. """
+        return header if header % 2 else (header - 1) & 0xFF
+
+    def offer(self, frame, crc_ok, now, status=None):
+        """ Adds a received frame with its packet status. Returns (frame, status) of a reading that is
+        ready, otherwise None. """
+        key = self.key(frame[0])
+        if key in self.released:
+            self.stats.duplicates += 1
+            log.debug("Duplicate of an already released reading: %s", frame[0])
+            return None
+
+        partner = self.pending.pop(key, None)
+        if partner is not None:
+            partner_frame, partner_crc_ok, _, partner_status = partner
+            if partner_frame[0] == frame[0]:
+                # Same copy received again, keep waiting for its partner
+                self.pending[key] = partner
+                self.stats.duplicates += 1
+                return None
+            self.released.append(key)
+            if partner_frame[1:] == frame[1:]:
+                return (frame, status) if crc_ok else (partner_frame, partner_status)
+            # Copies differ: trust the one that passed the CRC check if only one did
+            if crc_ok != partner_crc_ok and self.accept_single:
+                return (frame, status) if crc_ok else (partner_frame, partner_status)
+            log.debug("Packets don't match. Skipping this packet")
+            self.stats.reject("mismatch")
+            return None
+
+        # A new reading started, so the partners of older held copies are lost. The header of a frame
+        # that failed the CRC check may be corrupted, so such a frame doesn't end the older readings
+        released = None
+        if crc_ok:
+            for old_key in list(self.pending):
+                old_frame, old_crc_ok, _, old_status = self.pending.pop(old_key)
+                released = self._release_single(old_key, old_frame, old_crc_ok, old_status) or released
+        self.pending[key] = (frame, crc_ok, now, status)
+        return released
+
+    def expire(self, now):
+        """ Returns (frame, status) of a held single copy whose partner did not arrive within hold seconds,
+        otherwise None. """
+        for key, (frame, crc_ok, received, status) in list(self.pending.items()):
+            if now - received >= self.hold:
+                del self.pending[key]
+                return self._release_single(key, frame, crc_ok, status)
+        return None
+
+    def next_expiry(self):
+        """ Returns the monotonic time at which the oldest held copy expires, None if no copy is held. """
+        held = next(iter(self.pending.values()), None)
+        return held[2] + self.hold if held is not None else None
+
+    def _release_single(self, key, frame, crc_ok, status):
+        if crc_ok:
+            # The key of a frame that failed the CRC check is not remembered, it may be corrupted
+            self.released.append(key)
+        if crc_ok and self.accept_single:
+            self.stats.singles += 1
+            log.debug("Accepting single copy of reading: %s", frame[0])
+            return frame, status
+        log.debug("Dropping single copy of reading: %s", frame[0])
+        self.stats.reject("crc" if not crc_ok else "single")
+        return None
+
+
+class LinkStats(object):
+    """ Packet loss and link quality accounting keyed on the sender's one byte header counter.
+
+    Gaps in the header sequence (modulo 256) count lost frames, a header that goes backwards counts as
+    out of order and is no longer lost if it fell in a counted gap. Frames that failed the CRC check are
+    left out of the sequence accounting, as their header may be corrupted. Rejected frames are counted by reason and RSSI/SNR are smoothed with an EWMA. """
+
+    # A header at most this far behind the last one is an out of order frame, further is a resync
+    REORDER_WINDOW = 16
+
+    def __init__(self, alpha=0.1, log_interval=3600):
+        self.alpha = alpha
+        self.log_interval = log_interval
+        self.frames = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.resyncs = 0
+        self.singles = 0
+        self.crc_errors = 0
+        self.rejected = collections.Counter()
+        self.rssi = None
+        self.snr = None
+        self.last_header = None
+        self.unsequenced = 0  # Frames that failed the CRC check since the last sequenced frame
+        # Recent headers counted as lost, a late frame with one of them was not lost after all
+        self.missing = collections.deque(maxlen=self.REORDER_WINDOW)
+        self.last_log = time.monotonic()
+
+    def frame(self, header, crc_ok, rssi, snr):
+        """ Accounts for a frame of the expected length read from the radio. """
+        self.frames += 1
+        if self.rssi is None:
+            self.rssi, self.snr = rssi, snr
+        else:
+            self.rssi += self.alpha * (rssi - self.rssi)
+            self.snr += self.alpha * (snr - self.snr)
+        if not crc_ok:
+            self.crc_errors += 1
+            self.unsequenced += 1
+            return
+        # Frames that failed the CRC check were received, they fill the gap up to this header
+        unsequenced, self.unsequenced = self.unsequenced, 0
+        if self.last_header is not None:
+            delta = (header - self.last_header) & 0xFF
+            if delta == 0:
+                return
+            if delta >= 256 - self.REORDER_WINDOW:
+                # Header went slightly backwards: an older frame arriving late
+                self.out_of_order += 1
+                if header in self.missing:
+                    self.missing.remove(header)
+                    self.lost = max(self.lost - 1, 0)
+                return
+            if delta < 128:
+                lost = max(delta - 1 - unsequenced, 0)
+                self.lost += lost
+                self.missing.extend((header - 1 - i) & 0xFF for i in reversed(range(min(lost, self.REORDER_WINDOW))))
+            else:
+                # Sequence jumped, most likely the Pico restarted. Start counting from this frame
+                self.resyncs += 1
+                self.missing.clear()
+        self.last_header = header
+
+    def reject(self, reason):
+        self.rejected[reason] += 1
+
+    def packet_error_rate(self):
+        """ Percentage of the frames sent by the Pico that were lost or rejected. """
+        expected = self.frames + self.lost
+        if not expected:
+            return 0.0
+        return 100.0 * (self.lost + sum(self.rejected.values())) / expected
+
+    def fields(self):
+        """ Link statistics as extra loop packet fields. """
+        return {"rxFrames": self.frames,
+                "rxLost": self.lost,
+                "rxDuplicates": self.duplicates,
+                "rxOutOfOrder": self.out_of_order,
+                "rxResyncs": self.resyncs,
+                "rxSingles": self.singles,
+                "rxCrcErrors": self.crc_errors,
+                "rxRejected": sum(self.rejected.values()),
+                "rxPacketErrorRate": self.packet_error_rate(),
+                "rxRssi": self.rssi,
+                "rxSnr": self.snr}
+
+    def summary(self):
+        return ("frames: %d, lost: %d, duplicates: %d, out of order: %d, resyncs: %d, single copies: %d, "
+                "CRC errors: %d, rejected: %s, PER: %.1f%%, RSSI: %s dBm, SNR: %s dB"
+                % (self.frames, self.lost, self.duplicates, self.out_of_order, self.resyncs, self.singles,
+                   self.crc_errors,
+                   dict(self.rejected), self.packet_error_rate(),
+                   "%.1f" % self.rssi if self.rssi is not None else "-",
+                   "%.1f" % self.snr if self.snr is not None else "-"))
+
+    def log_due(self, now):
+        """ Returns True once every log_interval seconds. """
+        if self.log_interval <= 0 or now - self.last_log < self.log_interval:
+            return False
+        self.last_log = now
+        return True
+
+
+class StageTimer(object):
+    """ Rolling latency statistics for the stages of the receive loop.
+
+    The last window durations of every stage are kept, p50/p95/max are computed on demand. Stages are
+    init (radio open and configure), wait (request until RX done), read (FIFO readout), decode (decode
+    and unit conversion), queue (reading waiting for genLoopPackets) and weewx (weeWX handling a packet). """
+
+    STAGES = ("init", "wait", "read", "decode", "queue", "weewx")
+
+    def __init__(self, window=256, log_every=100, fields=False):
+        self.window = window
+        self.log_every = log_every
+        self.include_fields = fields
+        self.samples = dict((stage, collections.deque(maxlen=window)) for stage in self.STAGES)
+        self.packets = 0
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def percentiles(self, stage):
+        """ Returns (p50, p95, max) in seconds of the stage, or None without samples. """
+        samples = sorted(self.samples[stage])
+        if not samples:
+            return None
+        last = len(samples) - 1
+        return samples[last // 2], samples[(last * 95 + 50) // 100], samples[last]
+
+    def fields(self):
+        """ Stage latencies in milliseconds as extra loop packet fields, e.g. latWaitP95. """
+        data = dict()
+        if not self.include_fields:
+            return data
+        for stage in self.STAGES:
+            values = self.percentiles(stage)
+            if values is not None:
+                name = "lat" + stage.capitalize()
+                data[name + "P50"], data[name + "P95"], data[name + "Max"] = [v * 1000.0 for v in values]
+        return data
+
+    def summary(self):
+        parts = []
+        for stage in self.STAGES:
+            values = self.percentiles(stage)
+            if values is not None:
+                parts.append("%s p50/p95/max %.2f/%.2f/%.2f ms" % ((stage,) + tuple(v * 1000.0 for v in values)))
+        return ", ".join(parts)
+
+    def packet_done(self):
+        """ Counts a loop packet. Returns True once every log_every packets. """
+        self.packets += 1
+        return self.log_every > 0 and self.packets % self.log_every == 0
+
+
+class RadioWatchdog(object):
+    """ Detects a radio that stopped receiving.
+
+    Consecutive receive waits that timed out and consecutive frames that failed the CRC check are counted.
+    Once either count reaches its threshold (0 disables it) the radio is due for recovery. The stall is the
+    time since the last CRC clean frame and keeps growing until the radio receives again. """
+
+    def __init__(self, max_timeouts=5, max_crc_errors=10):
+        self.max_timeouts = max_timeouts
+        self.max_crc_errors = max_crc_errors
+        self.timeouts = 0
+        self.crc_errors = 0
+        self.recoveries = 0  # Number of recoveries, resets included
+        self.resets = 0  # Number of recoveries that needed a hardware reset
+        self.last_frame = time.monotonic()
+
+    def frame(self, crc_ok, now):
+        """ Accounts for a received frame. Returns True if the radio is due for recovery. """
+        self.timeouts = 0
+        if crc_ok:
+            self.crc_errors = 0
+            self.last_frame = now
+            return False
+        self.crc_errors += 1
+        return 0 < self.max_crc_errors <= self.crc_errors
+
+    def timeout(self):
+        """ Accounts for a receive wait that timed out. Returns True if the radio is due for recovery. """
+        self.timeouts += 1
+        return 0 < self.max_timeouts <= self.timeouts
+
+    def stall(self, now):
+        return now - self.last_frame
+
+    def recovered(self):
+        self.timeouts = 0
+        self.crc_errors = 0
+        self.recoveries += 1
+
+
 class ByowsRpiStation(object):
     """ Object that represents a BYOWS_Station. """
 
     def __init__(self, **params):
         """ Initialize Object. """
-        self.last_wind_time = time.time()
+        self.last_wind_time = time.monotonic()
         self.anemometer_radius_cm = 9.0  # Radius of your anemometer
         self.anemometer_adjustment = 1.18
         self.CM_IN_A_KM = 100000.0
         self.SECS_IN_AN_HOUR = 3600
+        self.stats = LinkStats(params.get("link_stats_alpha", 0.1), params.get("link_stats_log_interval", 3600))
+        self.matcher = DuplicateMatcher(params.get("dedup_window", 8), params.get("accept_single_copy", True),
+                                        params.get("dedup_hold", 1.0), self.stats)
+        self.vane_table = build_vane_table(params.get("vane_calibration", DEFAULT_VANE_CALIBRATION),
+                                           params.get("vane_snap", False))
+
+        # SPI is defined by bus ID and cs ID and IO pins defined by chip and offset number
+        self.spi_bus = params.get("spi_bus", 0)
+        self.spi_cs = params.get("spi_cs", 0)
+        self.gpio_chip = params.get("gpio_chip", 0)
+        self.cs_pin = params.get("cs_pin", 8)
+        self.reset_pin = params.get("reset_pin", 24)
+        # GPIO offset wired to the SX127x DIO0 pin. When set, receive waits on the RX done
+        # edge instead of polling the IRQ flags register.
+        self.irq_pin = params.get("irq_pin")
+        # Let the kernel chip select frame SPI transfers instead of toggling cs_pin through GPIO
+        self.spi_hardware_cs = params.get("spi_hardware_cs", True)
+        # Keep a shadow copy of the SX127x configuration registers to save SPI reads
+        self.register_cache = params.get("register_cache", False)
+        # Modem and packet settings, written to the radio with a burst write and verified by one burst read
+        self.profile = params.get("radio_profile") or radio_profile_from_config({})
+        # Keep the radio in RX continuous mode so it receives the next frame into the FIFO while the
+        # previous one is handled, instead of going to standby after every frame
+        self.rx_continuous = params.get("rx_continuous", True)
+        self.listening = False  # Set once RX continuous mode was requested in this radio session
+        # Seconds a receive waits for a frame, 0 waits forever. The watchdog recovers the radio after
+        # watchdog_timeouts waits in a row timed out or watchdog_crc_errors frames in a row failed the CRC
+        self.rx_timeout = params.get("rx_timeout", 60.0)
+        self.watchdog = RadioWatchdog(params.get("watchdog_timeouts", 5), params.get("watchdog_crc_errors", 10))
+
+        # Capture every raw frame to a trace file, or replay a trace instead of using the radio.
+        # replay_speed is "realtime" to keep the recorded spacing or "fast" to replay back to back.
+        self.trace = TraceWriter(params["trace_file"]) if params.get("trace_file") else None
+        self.replay_file = params.get("replay_file")
+        self.replay_speed = params.get("replay_speed", "realtime")
+        self.finished = False  # Set once a replayed trace has run out of frames
+        self.stopping = threading.Event()  # Set to interrupt a receive wait when the driver shuts down
+        # In-process SX127xEmulator used instead of the SPI and GPIO hardware, for benchmarks
+        self.emulator = params.get("emulator")
+        # Optional StageTimer, None when latency instrumentation is disabled
+        self.timer = params.get("timer")
+
+        # The radio session is opened once and reused for every reading. It is only
+        # re-initialised when a failure is detected (see check_radio).
+        self.LoRa = None
+        self.spi = None
+        self.gpios = []
+        self.radio_inits = 0  # Number of times the radio was (re)initialised
+        self.configure_time = 0.0  # Seconds spent resetting and configuring the radio
+        self.receive_time = 0.0  # Seconds spent waiting for and reading packets
+        self.rx_time = 0.0  # Wall clock time at RX done of the last frame
+        self.rx_buffer = bytearray(256)  # The SX127x FIFO holds at most 256 bytes
+        self.rx_view = memoryview(self.rx_buffer)
+        # Wall clock time at RX done of the last frame received with each header, used as the packet dateTime
+        self.rx_times = [0.0] * 256
+        self.open_radio()
 
     def reset_wind(self):
-        self.last_wind_time = time.time()
+        self.last_wind_time = time.monotonic()
+
+    def wind_interval(self):
+        """ Seconds since the previous wind reading on the local monotonic clock. """
+        return time.monotonic() - self.last_wind_time
 
     def calculate_speed(self, time_sec, rotations):
         circumference_cm = (2 * math.pi) * self.anemometer_radius_cm
@@ -175,152 +822,287 @@ class ByowsRpiStation(object):
         final_speed = km_per_hour * self.anemometer_adjustment
         return final_speed
 
-    def get_wind_speed(self, rotations):
-        """ Function that returns wind speed in km/hr. """
-        wind_speed = self.calculate_speed(time.time() - self.last_wind_time, rotations)
+    def get_wind_speed(self, rotations, interval=None):
+        """ Function that returns wind speed in km/hr over interval seconds. Without the sender's
+        counting interval the time since the previous reading is used. """
+        if interval is None:
+            interval = self.wind_interval()
         self.reset_wind()  # reset last time reading
-        return wind_speed
+        if interval <= 0:
+            return 0.0
+        return self.calculate_speed(interval, rotations)
 
-    def get_wind(self, rotations, wind_dir):
+    def get_wind(self, rotations, wind_dir, interval=None):
         """ Function that returns wind as a vector: speed, direction."""
-        return self.get_wind_speed(rotations), read_direction(wind_dir)
-
-    def get_message(self, LoRa):
-        # Request for receiving a new LoRa packet
-        LoRa.request()
-        # Wait for an incoming LoRa packet
-        LoRa.wait()
-
-        # Put a received packet to message and counter variable
-        # read() and available() method must be called after request() or listen() method
-        message = []
-        # available() method return remaining received payload length and
-        # will decrement each read() or get() method called
-        while LoRa.available() > 1:
-            # message += chr(LoRa.read()) # This is used if the data is a string
-            message += [(LoRa.read())]  # Using this as all our data being received is bytes and int
-        counter = [LoRa.read()]  # Read the last byte
-        message += counter  # Append the last byte to the message
-        return message
+        return self.get_wind_speed(rotations, interval), read_direction(wind_dir, self.vane_table)
+
+    def open_radio(self):
+        """ Begin LoRa radio and configure it. Returns True if the radio is ready. """
+        start = time.monotonic()
+        self.close_radio()
+        self.listening = False
+        if self.replay_file:
+            LoRa = SX127xReplay(self.replay_file, realtime=self.replay_speed == "realtime")
+            self.radio_inits += 1
+            self.LoRa = LoRa
+            self.configure_time += time.monotonic() - start
+            log.info("Replaying LoRa trace %s", self.replay_file)
+            return True
+        # Begin LoRa radio with connected SPI bus and IO pins (cs and reset) on GPIO.
+        # The SPI device is kept open for the lifetime of the radio session.
+        if self.emulator is not None:
+            emulator = self.emulator
+            spi = emulator.spi(hardwareCs=self.spi_hardware_cs)
+            cs = emulator.gpio(emulator.PIN_CS)
+            reset = emulator.gpio(emulator.PIN_RESET)
+            irq = emulator.gpio(emulator.PIN_DIO0) if self.irq_pin is not None else None
+        else:
+            spi = LoRaSpi(self.spi_bus, self.spi_cs, hardwareCs=self.spi_hardware_cs)
+            cs = LoRaGpio(self.gpio_chip, self.cs_pin)
+            reset = LoRaGpio(self.gpio_chip, self.reset_pin)
+            irq = LoRaGpio(self.gpio_chip, self.irq_pin) if self.irq_pin is not None else None
+        self.spi = spi
+        # The GPIO lines are requested on first use and held until the session is closed
+        self.gpios = [gpio for gpio in (cs, reset, irq) if gpio is not None]
+        LoRa = SX127x(spi, cs, reset, irq)
+        if self.register_cache:
+            LoRa.enableCache()
+        self.radio_inits += 1
+        if not LoRa.begin():
+            log.error("Something went wrong with LoRa radio. Can't start it")
+            self.LoRa = None
+            self.configure_time += time.monotonic() - start
+            return False
+
+        if not self.configure_radio(LoRa):
+            log.error("LoRa radio did not accept %s", self.profile)
+            self.LoRa = None
+            self.configure_time += time.monotonic() - start
+            return False
+        self.LoRa = LoRa
+        self.configure_time += time.monotonic() - start
+        if self.timer is not None:
+            self.timer.add("init", time.monotonic() - start)
+        log.info("LoRa radio initialised (init #%d)", self.radio_inits)
+        return True
+
+    def close_radio(self):
+        """ Put the radio to sleep and release the SPI device. """
+        if self.LoRa is not None:
+            try:
+                self.LoRa.end()
+            except Exception as exc:
+                log.debug("Error putting LoRa radio to sleep: %s", exc)
+            self.LoRa = None
+        if self.spi is not None:
+            self.spi.close()
+            self.spi = None
+        for gpio in self.gpios:
+            gpio.close()
+        self.gpios = []
+
+    def close_trace(self):
+        """ Close the capture trace file if one is open. """
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+    def configure_radio(self, LoRa):
+        """ Apply the modem and packet settings used by the Pico sender. Returns True if the radio
+        reads back the settings that were written. """
+        # Frequency, RX gain, modulation (SF, BW, CR) and packet parameters (header type, preamble length,
+        # payload length, CRC) and sync word in one go. Receiver must have the same SF and BW setting
+        # with transmitter to be able to receive LoRa packet
+        return LoRa.applyProfile(self.profile)
+
+    def check_radio(self):
+        """ Check that the radio still answers with a known version and is in LoRa mode.
+        Closes the session so that the next reading re-initialises the radio if it doesn't. """
+        LoRa = self.LoRa
+        if LoRa is None:
+            return False
+        # Refresh the register cache, otherwise the version would come from the cache
+        LoRa.sync()
+        version = LoRa.readRegister(LoRa.REG_VERSION)
+        op_mode = LoRa.readRegister(LoRa.REG_OP_MODE)
+        if version in (0x12, 0x22) and op_mode & LoRa.LONG_RANGE_MODE:
+            return True
+        log.info("LoRa radio not responding (version: %s, op mode: %s). Re-initialising", version, op_mode)
+        self.close_radio()
+        return False
+
+    def recover_radio(self, reason):
+        """ Bring back a radio that stopped receiving. The radio is put to standby and the profile applied
+        again, it is only reset through open_radio() when it doesn't accept the profile or stopped answering.
+        Returns True if the radio is ready. """
+        stall = self.watchdog.stall(time.monotonic())
+        self.watchdog.recovered()
+        # RX is requested again by the next get_message()
+        self.listening = False
+        LoRa = self.LoRa
+        if LoRa is not None:
+            try:
+                LoRa.standby()
+                if self.configure_radio(LoRa) and self.check_radio():
+                    log.warning("LoRa radio reconfigured after %s, stalled for %.0f s", reason, stall)
+                    return True
+            except Exception as exc:
+                log.debug("Error reconfiguring LoRa radio: %s", exc)
+        self.watchdog.resets += 1
+        if self.open_radio():
+            log.warning("LoRa radio reset after %s, stalled for %.0f s", reason, stall)
+            return True
+        log.error("LoRa radio reset failed after %s, stalled for %.0f s", reason, stall)
+        return False
+
+    def timing(self):
+        """ Returns the radio session counters: how often the radio was initialised and how much
+        time was spent configuring it versus receiving packets. """
+        return {"radio_inits": self.radio_inits,
+                "configure_time": self.configure_time,
+                "receive_time": self.receive_time,
+                "recoveries": self.watchdog.recoveries,
+                "resets": self.watchdog.resets,
+                "irq_latency": self.LoRa.irqLatency() if self.LoRa is not None else 0.0}
+
+    def timing_summary(self):
+        timing = self.timing()
+        return ("inits: %d, configure: %.1f s, receive: %.1f s, recoveries: %d, resets: %d, IRQ latency: %.2f ms"
+                % (timing["radio_inits"], timing["configure_time"], timing["receive_time"], timing["recoveries"],
+                   timing["resets"], timing["irq_latency"] * 1000.0))
+
+    def get_message(self, LoRa, timeout=0):
+        """ Returns the next received frame, or None if none arrived within timeout seconds (0 waits
+        forever) or a replayed trace ran out of frames. """
+        timer = self.timer
+        if timer is not None:
+            start = time.monotonic()
+        # Request for receiving a new LoRa packet. RX continuous mode is requested once per radio session
+        if not self.listening:
+            LoRa.request(LoRa.RX_CONTINUOUS if self.rx_continuous else 0)
+            self.listening = self.rx_continuous
+        # Wait for an incoming LoRa packet in slices of at most WAIT_SLICE seconds, so that a stop request
+        # is noticed. The radio stays in RX mode after a timeout, so the next call keeps waiting for the
+        # same request
+        deadline = time.monotonic() + timeout if timeout > 0 else None
+        while True:
+            if self.stopping.is_set():
+                return None
+            wait = WAIT_SLICE
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return None
+            if LoRa.wait(wait):
+                break
+            if getattr(LoRa, "finished", False):
+                return None
+        self.rx_time = time.time()
+        if timer is not None:
+            received = time.monotonic()
+            timer.add("wait", received - start)
+
+        # Read the whole received packet from the FIFO in one SPI transaction into the preallocated buffer.
+        # readInto() must be called after wait() and reads the payload length left by available().
+        # wait() snapshots FIFO start, length, RSSI and SNR of the frame in one burst, so the radio can
+        # already receive the next frame meanwhile
+        length = LoRa.readInto(self.rx_buffer)
+        if timer is not None:
+            timer.add("read", time.monotonic() - received)
+        return bytes(self.rx_view[:length])
 
     def check_message_length(self, message, expected_data_length):
-        if len(message) != expected_data_length + 1:
-            print("Mostly junk data received for the first packet. Skipping this packet")
-            log.debug("Mostly junk data received for the first packet. Skipping this packet")
-            return None
+        if len(message) != expected_data_length + 1 and len(message) != INTERVAL_DATA_LENGTH + 1:
+            log.debug("Mostly junk data received (%d bytes). Skipping this packet", len(message))
+            return False
+        return True
 
     def get_data(self):
         """ Generates data packets every time interval. """
 
-        currentdir = os.path.dirname(os.path.realpath(__file__))
-        sys.path.append(os.path.dirname(os.path.dirname(currentdir)))
-
-        # Define the data packet size we expect to receive.
-        # This will be used to check against junk packets and discard them to
-        # Adjust the expected packet size depending on the data being received.
-        # For BME280 sensor values, we expect 15 payload lengths for data and 1 for header.
-        expected_data_length = 15
+        expected_data_length = EXPECTED_DATA_LENGTH
 
-        # Begin LoRa radio with connected SPI bus and IO pins (cs and reset) on GPIO
-        # SPI is defined by bus ID and cs ID and IO pins defined by chip and offset number
-        spi = LoRaSpi(0, 0)
-        cs = LoRaGpio(0, 8)
-        reset = LoRaGpio(0, 24)
-        LoRa = SX127x(spi, cs, reset)
-        res = []
-        # print("Begin LoRa radio")
-        if not LoRa.begin():
-            # raise Exception("Something wrong, can't begin LoRa radio")
-            print ("Something went wrong with LoRa radio. Can't start it")
-            log.debug("Something went wrong with LoRa radio. Can't start it")
+        if self.stopping.is_set():
             return None
-
-        # Set frequency to 433 Mhz
-
-        # print("Set frequency to 433 Mhz")
-        LoRa.setFrequency(433000000)
-
-        # Set RX gain. RX gain option is power saving gain or boosted gain
-        # print ("Set RX gain to power saving gain")
-        LoRa.setRxGain(LoRa.RX_GAIN_POWER_SAVING, LoRa.RX_GAIN_AUTO)  # AGC on, Power saving gain
-
-        # Configure modulation parameter including spreading factor (SF), bandwidth (BW), and coding rate (CR)
-        # Receiver must have the same SF and BW setting with transmitter to be able to receive LoRa packet
-        # print ("Set modulation parameters:\n\tSpreading factor = 7\n\tBandwidth = 125 kHz\n\tCoding rate = 4/5")
-        LoRa.setSpreadingFactor(7)  # LoRa spreading factor: 7
-        LoRa.setBandwidth(125000)  # Bandwidth: 125 kHz
-        LoRa.setCodeRate(5)  # Coding rate: 4/5
-
-        # Configure packet parameter including header type, preamble length, payload length, and CRC type
-        # The explicit packet includes header contain CR, number of byte, and CRC type
-        # Receiver can receive packet with different CR and packet parameters in explicit header mode
-        # print("Set packet parameters:\n\tExplicit header type\n\tPreamble length = 12\n\tPayload Length =",
-        #      expected_data_length + 1, "\n\tCRC on")
-        LoRa.setHeaderType(LoRa.HEADER_EXPLICIT)  # Explicit header mode
-        LoRa.setPreambleLength(12)  # Set preamble length to 12
-        LoRa.setPayloadLength(expected_data_length + 1)  # Initialize payloadLength to the expected data + 1 for header
-        LoRa.setCrcEnable(True)  # Set CRC enable
-
-        # Set synchronize word for public network (0x14).
-        # Others that work are 0x10, 0x15, 0x13 as per the sender's configuration
-        # print ("Set synchronize word to 0x14")
-        # LoRa.setSyncWord(0x10)
-        LoRa.setSyncWord(0x14)
-        # LoRa.setSyncWord(0x15)
-        # LoRa.setSyncWord(0x13)
-
-        # print("\n-- LoRa Receiver --\n")
-
-        ##############################
-        # Receive the first message
-        ##############################
-        message = self.get_message(LoRa)
-
-        # If the first packet length is not as expected, skip the entire loop.
-        self.check_message_length(message, expected_data_length)
-
-        # The first message should have an odd number header. If not, skip and don't get the next packet
-        if message[0] % 2 == 0:
-            log.debug("Even number packet for fist message. Skipping")
-            log.debug("Message: %s", message)
+        # Reuse the radio session, only re-initialising it when it was dropped after a failure
+        if self.LoRa is None and not self.open_radio():
             return None
+        LoRa = self.LoRa
+
+        # Release a single copy whose partner didn't arrive in time before listening again
+        released = self.matcher.expire(time.monotonic())
+        if released is None:
+            start = time.monotonic()
+            # Wake up in time to release a held single copy. A wait cut short for that is not a receive timeout
+            timeout = self.rx_timeout
+            expiry = self.matcher.next_expiry()
+            held = expiry is not None and (timeout <= 0 or expiry - start < timeout)
+            if held:
+                timeout = max(expiry - start, 0.001)
+            frame = self.get_message(LoRa, timeout)
+            self.receive_time += time.monotonic() - start
+            if frame is None:
+                if getattr(LoRa, "finished", False):
+                    log.info("End of LoRa trace %s", self.replay_file)
+                    self.finished = True
+                elif not held and not self.replay_file and not self.stopping.is_set() and self.watchdog.timeout():
+                    self.recover_radio("%d receive timeouts of %g s" % (self.watchdog.timeouts, timeout))
+                return None
+
+            # Read the packet status once per frame into a record that stays with the frame until its reading
+            # is released. The IRQ flags must be taken before status() resets them
+            irq_flags = LoRa.irqStatus()
+            packet = PacketStatus(LoRa.packetRssi(), LoRa.snr(), irq_flags, LoRa.status())
+            if frame:
+                self.rx_times[frame[0]] = self.rx_time
+            if self.trace is not None:
+                self.trace.write(frame, packet.rssi, packet.snr, irq_flags)
+
+            if packet.status == LoRa.STATUS_CRC_ERR:
+                log.debug("CRC error")
+            elif packet.status == LoRa.STATUS_HEADER_ERR:
+                log.debug("Packet header error")
+            crc_ok = packet.status != LoRa.STATUS_CRC_ERR
+            now = time.monotonic()
+            if self.watchdog.frame(crc_ok, now):
+                self.recover_radio("%d CRC errors in a row" % self.watchdog.crc_errors)
+
+            # If the packet length is not as expected, skip it.
+            if not self.check_message_length(frame, expected_data_length):
+                self.stats.frames += 1
+                self.stats.reject("length")
+                self.check_radio()
+                return None
+
+            self.stats.frame(frame[0], crc_ok, packet.rssi, packet.snr)
+            if self.stats.log_due(now):
+                log.info("Link statistics: %s", self.stats.summary())
+                log.info("Radio session: %s", self.timing_summary())
+
+            # Debugging - Writing to file to see the raw data being received
+            # with open("output.log", "a") as debug_log_file:
+            #    print("Raw message received:", frame, file=debug_log_file)
+            log.debug("Raw message received: %s", frame)
 
-        ##############################
-        # Receive the second message
-        ##############################
-        # Receive the same packet twice to ensure no junk data is being received.
-        # This will have message[0] + 1 as header number
-        message_check = self.get_message(LoRa)
-
-        # If the second packet length is not as expected, skip the entire loop.
-        self.check_message_length(message_check, expected_data_length)
+            # The Pico sends every reading twice. Only continue once the copies are paired up,
+            # or a single CRC clean copy is accepted. The reading comes with the status of the copy it was taken from
+            released = self.matcher.offer(frame, crc_ok, now, packet)
+            if released is None:
+                return None
+        message, packet = released
 
-        # The second message should have an even number header. If not, skip and don't get the next packet
-        if message_check[0] % 2 != 0:
-            log.debug("Odd number packet for second message. Skipping")
-            log.debug("Message: %s", message_check)
-            return None
-
-        """ Packet structure
-        Example:
-        [(1)1,  (2)0, (3)24,    (4)0, (5)81,    (6)3, (7)112,   (8)0, (9)69,    (10)0, (11)66,  (12)0, (13)90,
-        (14)3,  (15)5,  (16)12]]
-        [(1)packet header#,    (2)byte_array, (3)temp_d1,      (4)byte_array, (5)temp_d2,
-        (6)byte_array, (7)pressure_d1,      (8)byte_array, (9)pressure_d2,      (10)byte_array, (11)humidity_d1,
-        (12)byte_array, (13)humidity_d2,    (14)rainfall(bucket tips),          (15)windcount (Anemometer rotations),
-        (16)windDir (Wind vane) ]
-        """
+        # Debug output is only formatted when debug logging is enabled
+        debug = log.isEnabledFor(logging.DEBUG)
+        if debug:
+            log.debug("Packet status: RSSI = %0.2f dBm | SNR = %0.2f dB", packet.rssi, packet.snr)
 
-        # Print packet/signal status including RSSI, SNR, and signalRSSI
-        print("Packet status: RSSI = {0:0.2f} dBm | SNR = {1:0.2f} dB".format(LoRa.packetRssi(), LoRa.snr()))
-        log.debug("Packet status: RSSI = {0:0.2f} dBm | SNR = {1:0.2f} dB".format(LoRa.packetRssi(), LoRa.snr()))
+        timer = self.timer
+        if timer is not None:
+            start = time.monotonic()
 
         # Get the signal strength to store in the database
-        # to Get the percentage relative to the values stored in RSSI_range
-        # https://stackoverflow.com/questions/53822430/percentage-of-array-between-values
-        RSSI = [LoRa.packetRssi()]
-        freq = np.histogram(RSSI_range, bins=[-np.inf] + RSSI + [np.inf])[0] / RSSI_range.size
-        signal_strength = freq[0] * 100  # Convert to percentage
+        # as the percentage of the RSSI range (RSSI_MIN to RSSI_MAX) below the packet RSSI
+        signal_strength = signal_percent(packet.rssi)
 
         """
         ==================
@@ -328,120 +1110,39 @@ class ByowsRpiStation(object):
         ==================
         """
 
-        """
-        Skip the first element in message as that is the header which shows the count of the packet.
-        It is used to see what packets have been dropped
-        """
-        message_no_header = message[1:]
-        message_no_header_check = message_check[1:]
-
-        # Debugging - Writing to file to see the raw data being received
-        # with open("output.log", "a") as debug_log_file:
-        #    print("Raw message received:", message, file=debug_log_file)
-        #    print("Raw message check received:", message_check, file=debug_log_file)
-        log.debug("Raw message received: %s", message)
-        log.debug("Raw message check received: %s", message_check)
-
-        # Check to make sure both packets received are same. If not discard them.
-        # The check message should be the next consecutive package
-        if message_check[0] != message[0] + 1:
-            log.debug("Check message is not the next one after message. Skipping")
-            return None
-        if message_no_header != message_no_header_check:
-            print("Packets don't match. Skipping this packet")
-            log.debug("Packets don't match. Skipping this packet")
-            return None
-
-        # Check against the expected packet size
-        # If the packet size (message) is not as expected, skip processing this packet
-        if len(message_no_header) != expected_data_length:
-            print("Mostly junk data received. Skipping this packet")
-            log.debug("Mostly junk data received. Skipping this packet")
-            return None
-
-        # Get 2 elements at a time to decode the value to int from 2 int arrays
-        # lg = len(message_no_header) # Skipping the rain,
-        # which is the 13th and 14th element as the processing is done separately.
-        # The 15th and 16th elements are for anemometer,
-        # The 17th and 18th elements are for Wind Vane.
-        lg = 12
-        lg = lg - 1  # Decrement length by 1 as we start the count from 0
-        # tup = tuple() # Should be a tuple as the received data must not be changed
-        decoded_tup = []
-        for k in range(0, lg, 2):
-            tup = [message_no_header[k], message_no_header[k + 1]]
-            # Getting single int from 2 array bytes
-            decoded_tup += [int.from_bytes(tup, byteorder='big', signed=True)]
-
-        # Debugging - Writing to file to see where Index out of range error is occurring
-        # with open("output.log", "a") as debug_log_file:
-        #    print("Undecoded:", message_no_header, file=debug_log_file)
-        #    print("Decoded tup:", decoded_tup, file=debug_log_file)
-        log.debug("Undecoded: %s", message_no_header)
-        log.debug("Decoded tup: %s", decoded_tup)
-
-        # Converting the int to float as decoded_tup is now in int format converted from bytes
-        float_value = []
-        lx = len(decoded_tup)
-        lx = lx - 1  # Decrement length by 1 as we start the count from 0
-        # First, convert the int to string so that we can add the decimal point
-        for k2 in range(0, lx, 2):
-            d2 = decoded_tup[k2 + 1]
-            # https://www.geeksforgeeks.org/how-to-add-leading-zeros-to-a-number-in-python/
-            # Adding leading 0 that was stripped off for the decimal on the sender side
-            tup2 = str(decoded_tup[k2]) + '.' + str(d2).rjust(2,
-                                                              '0')
-            float_value += [tup2]
-
-        # To avoid index out of range error, doing an additional check
-        if len(float_value) != 3:
-            print("Something went wrong in processing the packet. Skipping this packet")
-            log.debug("Something went wrong in processing the packet. Skipping this packet")
-            return None
-
-        # Sometimes junk data is sent in packets, and this might lead to negative numbers after the decimal point.
-        # To avoid the program from stopping, I use the try except block to continue even if the data is incorrect
+        # Decode the whole frame in one call. Decimal parts are joined to their integer parts with the sign
         try:
-            # Converting the string to float
-            res = [float(ele) for ele in float_value]
-            print(message[0], "Temperature: ", res[0], "C", "Pressure: ", res[1], "hPa", "Humidity :", res[2], "%",
-                  "Bucket Tips: ", message_no_header[12], "Wind rotations", message_no_header[13],
-                  "Wind Direction:", message_no_header[14], "Signal Strength:", round(signal_strength))
-            log.debug("Temperature: %s, Pressure: %s, Humidity: %s, Bucket Tips: %s, Wind rotations:%s, "
-                      "Wind Direction: %s, Signal Strength: %s  ", res[0], res[1], res[2], message_no_header[12],
-                      message_no_header[13], message_no_header[14], round(signal_strength))
-
-            # Debugging - Writing to file to see where Index out of range error is occurring
-            # with open("output.log", "a") as debug_log_file:
-            #    print(message[0], "Temperature: ", res[0], "C", "Pressure: ", res[1], "hPa", "Humidity :", res[2], "%",
-            #          "Bucket Tips: ", message_no_header[12], "Wind rotations", message_no_header[13],
-            #          "Wind Direction:", message_no_header[14], "len(float_value)", len(float_value),
-            #          file=debug_log_file)
-
-        except Exception as exc:
-            print('[!!!] {err}'.format(err=exc))
-            log.debug("Error: %s", '[!!!] {err}'.format(err=exc))
+            reading = decode_frame(message)
+        except struct.error as exc:
+            log.debug("Error decoding packet: %s", exc)
+            self.stats.reject("decode")
             return None
-
-        # Show received status in case CRC or header error occur
-        status = LoRa.status()
-        if status == LoRa.STATUS_CRC_ERR:
-            print("CRC error")
-        elif status == LoRa.STATUS_HEADER_ERR:
-            print("Packet header error")
+        if debug:
+            log.debug("Reading %s: Temperature: %s, Pressure: %s, Humidity: %s, Bucket Tips: %s, Wind rotations: %s, "
+                      "Wind Direction: %s, Signal Strength: %s", reading.header, reading.temperature, reading.pressure,
+                      reading.humidity, reading.bucket_tips, reading.wind_count, reading.wind_vane,
+                      round(signal_strength))
 
         data = dict()
-        anem_rotations = message_no_header[13] / 2.0
-        time_interval = self.last_wind_time - time.time()
-        wind_speed, wind_dir = self.get_wind(message_no_header[13], message_no_header[14])  # Pass data from pico
-        data["outHumidity"] = res[2]
-        data["pressure"] = res[1]
-        data["outTemp"] = res[0]
+        anem_rotations = reading.wind_count / 2.0
+        # Counting interval sent by the Pico, or the local time since the previous reading for older firmware
+        time_interval = reading.interval if reading.interval is not None else self.wind_interval()
+        wind_speed, wind_dir = self.get_wind(reading.wind_count, reading.wind_vane, time_interval)  # Pass data from pico
+        # Stamp the reading with the RX done time of its frame rather than the time weeWX gets it
+        data["dateTime"] = int((self.rx_times[reading.header] or time.time()) + 0.5)
+        data["outHumidity"] = reading.humidity
+        data["pressure"] = reading.pressure
+        data["outTemp"] = reading.temperature
         # data["soilTemp1"] = self.get_soil_temp()
         data["windSpeed"] = float(wind_speed)
         data["windDir"] = wind_dir
-        data["rain"] = float(get_rainfall(message_no_header[12]))
+        data["rain"] = float(get_rainfall(reading.bucket_tips))
         data["anemRotations"] = anem_rotations
         data["timeAnemInterval"] = time_interval
         data["rxCheckPercent"] = signal_strength
+        data.update(self.stats.fields())
+        if timer is not None:
+            now = time.monotonic()
+            timer.add("decode", now - start)
+            data["_received"] = now
         return data
@@ -21,7 +21,10 @@ filelist = [('bin/user', ['bin/user/byows_rpi_lora.py']),
             ('bin/user/LoRaRF', ['bin/user/LoRaRF/__init__.py',
                                  'bin/user/LoRaRF/base.py',
                                  'bin/user/LoRaRF/SX127x.py',
-                                 'bin/user/LoRaRF/SX126x.py'])
+                                 'bin/user/LoRaRF/SX126x.py',
+                                 'bin/user/LoRaRF/trace.py',
+                                 'bin/user/LoRaRF/emulator.py',
+                                 'bin/user/LoRaRF/aio.py'])
             ]
 
 # ----- Configuration details for Weewx.conf -----
@@ -35,7 +38,91 @@ driver_config = """
     # [REQUIRED]
     # The driver to use.
     driver = user.byows_rpi_lora
-    loop_interval = 5
+    # Minimum seconds between loop packets, 0 yields every reading as soon as it is received.
+    # Readings arriving within loop_interval of the previous packet are merged into the next one
+    loop_interval = 0
+    # Number of readings buffered between the radio and weewx, and what to do when the
+    # buffer is full: drop_oldest or coalesce (merge into the newest reading)
+    queue_size = 8
+    queue_overflow = drop_oldest
+    # The Pico sends every reading twice. Accept a single CRC clean copy when the other one is lost,
+    # after waiting dedup_hold seconds for it. dedup_window is the number of recent readings
+    # remembered to drop late copies.
+    accept_single_copy = true
+    dedup_hold = 1.0
+    dedup_window = 8
+    # Packet loss and link quality statistics: log a summary every link_stats_log_interval seconds
+    # (0 disables it) and smooth RSSI/SNR with link_stats_alpha. The radio session counters (inits,
+    # configure and receive time, recoveries, IRQ latency) are logged with it
+    link_stats_log_interval = 3600
+    link_stats_alpha = 0.1
+    # Map wind vane readings that fall between calibration ranges to the nearest direction
+    wind_vane_snap = false
+    # Cache the SX127x configuration registers so bit updates and RSSI reads need fewer SPI transfers
+    register_cache = false
+    # Keep the radio receiving while a frame is handled, so the second copy of a reading is not missed.
+    # false puts the radio to standby after every frame as before
+    rx_continuous = true
+    # Seconds to wait for a frame before the wait is counted as a timeout, 0 waits forever.
+    # The radio is reconfigured, or reset if that fails, after watchdog_timeouts timeouts or
+    # watchdog_crc_errors CRC errors in a row (0 disables the check)
+    rx_timeout = 60
+    watchdog_timeouts = 5
+    watchdog_crc_errors = 10
+    # Per stage latency statistics (p50/p95/max) logged every latency_log_every packets
+    latency_stats = false
+    latency_window = 256
+    latency_log_every = 100
+    # Add the latencies in ms to the loop packets as latWaitP50, latWaitP95, latWaitMax, ...
+    latency_fields = false
+    # LoRa modem and packet settings, must match the Pico sender. They are written to the radio
+    # as one register image and read back to verify it
+    # frequency = 433000000
+    # spreading_factor = 7
+    # bandwidth = 125000
+    # coding_rate = 5
+    # low_data_rate_optimize = false
+    # header_type = explicit
+    # preamble_length = 12
+    # payload_length = 16
+    # crc = true
+    # sync_word = 0x14
+    # rx_gain is power_saving or boosted
+    # rx_gain = power_saving
+    # Wind vane calibration, replaces the built in table when present.
+    # direction in degrees = lowest reading, highest reading (10 bit ADC reading)
+    # [[wind_vane]]
+    #     0.0 = 130, 140
+    #     22.5 = 430, 436
+    #     45.0 = 370, 390
+    #     67.5 = 867, 875
+    #     90.0 = 846, 866
+    #     112.5 = 876, 900
+    #     135.0 = 690, 710
+    #     157.5 = 6, 7
+    #     180.0 = 560, 580
+    #     202.5 = 8, 9
+    #     225.0 = 230, 250
+    #     247.5 = 10, 11
+    #     270.0 = 40, 60
+    #     292.5 = 100, 120
+    #     315.0 = 70, 90
+    #     337.5 = 180, 200
+    # SPI bus/chip select and GPIO chip/pin offsets used by the LoRa radio
+    # spi_bus = 0
+    # spi_cs = 0
+    # gpio_chip = 0
+    # cs_pin = 8
+    # reset_pin = 24
+    # Let the kernel SPI chip select frame transfers instead of toggling cs_pin through GPIO
+    # spi_hardware_cs = true
+    # GPIO offset wired to DIO0. Enables interrupt driven receive instead of polling
+    # irq_pin = 17
+    # Append every raw frame (timestamp, RSSI, SNR, IRQ flags and payload) to a binary trace file
+    # trace_file = /var/tmp/byows_lora.trace
+    # Replay a trace file instead of using the radio. replay_speed is realtime or fast
+    # replay_file = /var/tmp/byows_lora.trace
+    # replay_speed = realtime
 
 
 """
@@ -0,0 +1,96 @@
+"""
+Pairing of the two copies of every Pico reading by DuplicateMatcher.
+
+Needs weewx to be importable, as the driver module is imported.
+
+Usage:
+    python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+try:
+    from user.byows_rpi_lora import DuplicateMatcher, FRAME_STRUCT
+except ImportError as exc:
+    raise unittest.SkipTest("driver not importable: %s" % exc)
+
+
+def frame(header, temperature=24):
+    return FRAME_STRUCT.pack(header, temperature, 81, 880, 69, 66, 90, 1, 12, 128)
+
+
+class DuplicateMatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = DuplicateMatcher(window=8, accept_single=True, hold=1.0)
+
+    def test_pair_in_order(self):
+        self.assertIsNone(self.matcher.offer(frame(1), True, 0.0, "s1"))
+        self.assertEqual(self.matcher.offer(frame(2), True, 0.1, "s2"), (frame(2), "s2"))
+        self.assertIsNone(self.matcher.next_expiry())
+
+    def test_pair_in_reverse_order(self):
+        self.assertIsNone(self.matcher.offer(frame(2), True, 0.0, "s2"))
+        self.assertEqual(self.matcher.offer(frame(1), True, 0.1, "s1"), (frame(1), "s1"))
+
+    def test_pair_across_header_wrap(self):
+        # Headers 255 and 0 are the two copies of one reading
+        for first, second in ((255, 0), (0, 255)):
+            matcher = DuplicateMatcher()
+            self.assertIsNone(matcher.offer(frame(first), True, 0.0))
+            self.assertEqual(matcher.offer(frame(second), True, 0.1), (frame(second), None))
+            self.assertEqual(matcher.stats.singles, 0)
+        # The next reading after the wrap pairs on its own
+        self.assertIsNone(matcher.offer(frame(1), True, 0.2))
+        self.assertEqual(matcher.offer(frame(2), True, 0.3), (frame(2), None))
+
+    def test_late_copy_is_duplicate(self):
+        self.matcher.offer(frame(1), True, 0.0)
+        self.matcher.offer(frame(2), True, 0.1)
+        self.assertIsNone(self.matcher.offer(frame(2), True, 0.2))
+        self.assertEqual(self.matcher.stats.duplicates, 1)
+
+    def test_single_copy_held_until_expiry(self):
+        self.assertIsNone(self.matcher.offer(frame(3), True, 10.0, "s3"))
+        self.assertEqual(self.matcher.next_expiry(), 11.0)
+        self.assertIsNone(self.matcher.expire(10.5))
+        self.assertEqual(self.matcher.expire(11.0), (frame(3), "s3"))
+        self.assertIsNone(self.matcher.next_expiry())
+        self.assertEqual(self.matcher.stats.singles, 1)
+        # Its partner arriving after the release is a late duplicate
+        self.assertIsNone(self.matcher.offer(frame(4), True, 11.5))
+        self.assertEqual(self.matcher.stats.duplicates, 1)
+
+    def test_single_copy_released_by_next_reading(self):
+        self.matcher.offer(frame(3), True, 0.0, "s3")
+        self.assertEqual(self.matcher.offer(frame(5), True, 0.2, "s5"), (frame(3), "s3"))
+        self.assertEqual(self.matcher.next_expiry(), 1.2)
+
+    def test_single_copy_dropped_without_accept_single(self):
+        matcher = DuplicateMatcher(accept_single=False, hold=1.0)
+        matcher.offer(frame(3), True, 0.0)
+        self.assertIsNone(matcher.expire(1.0))
+        self.assertEqual(matcher.stats.rejected["single"], 1)
+
+    def test_single_copy_failing_crc_dropped(self):
+        self.matcher.offer(frame(3), False, 0.0)
+        self.assertIsNone(self.matcher.expire(1.0))
+        self.assertEqual(self.matcher.stats.rejected["crc"], 1)
+
+    def test_mismatched_pair_rejected(self):
+        self.matcher.offer(frame(1, 24), True, 0.0)
+        self.assertIsNone(self.matcher.offer(frame(2, 25), True, 0.1))
+        self.assertEqual(self.matcher.stats.rejected["mismatch"], 1)
+        self.assertIsNone(self.matcher.next_expiry())
+
+    def test_mismatched_pair_takes_crc_clean_copy(self):
+        self.matcher.offer(frame(1, 24), True, 0.0, "s1")
+        self.assertEqual(self.matcher.offer(frame(2, 99), False, 0.1, "s2"), (frame(1, 24), "s1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
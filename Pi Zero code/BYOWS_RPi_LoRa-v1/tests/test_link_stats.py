@@ -0,0 +1,123 @@
+"""
+Link statistics and copy pairing of ByowsRpiStation.get_data(), run against the in-process SX127x emulator.
+
+Needs weewx to be importable, as the driver module is imported.
+
+Usage:
+    python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+try:
+    from user.LoRaRF.emulator import SX127xEmulator
+    from user.byows_rpi_lora import ByowsRpiStation, LinkStats, FRAME_STRUCT, signal_percent
+except ImportError as exc:
+    raise unittest.SkipTest("driver not importable: %s" % exc)
+
+
+def receive(frames):
+    """ Receives (frame, crc_error) pairs with a station on the emulator.
+    Returns the station and the readings it released. """
+    emulator = SX127xEmulator()
+    station = ByowsRpiStation(emulator=emulator, rx_timeout=0.2)
+    readings = []
+    for frame, crc_error in frames:
+        emulator.inject(frame, crcError=crc_error)
+        data = station.get_data()
+        if data is not None:
+            readings.append(data)
+    return station, readings
+
+
+def pico_stream(readings, corrupt=None):
+    """ Returns the frames the Pico sends for readings: every reading twice, with headers h and h + 1.
+    corrupt maps a header to the header byte its copy arrives with after failing the CRC check. """
+    corrupt = corrupt or {}
+    frames = []
+    for header in range(1, readings * 2 + 1):
+        frame = FRAME_STRUCT.pack(header, 24, 81, 880, 69, 66, 90, (header + 1) // 2, 12, 128)
+        if header in corrupt:
+            frames.append((bytes([corrupt[header]]) + frame[1:], True))
+        else:
+            frames.append((frame, False))
+    return frames
+
+
+class LinkStatsTest(unittest.TestCase):
+
+    def test_clean_stream(self):
+        station, readings = receive(pico_stream(10))
+        self.assertEqual(len(readings), 10)
+        self.assertEqual(station.stats.packet_error_rate(), 0.0)
+
+    def test_corrupted_header_outside_sequence(self):
+        # A corrupted header must not count gaps, reordering or resyncs, nor release or drop other readings
+        for header in (0x0F, 0x85):
+            station, readings = receive(pico_stream(10, {5: header}))
+            stats = station.stats
+            self.assertEqual(len(readings), 10, hex(header))
+            self.assertEqual(stats.crc_errors, 1)
+            self.assertEqual((stats.lost, stats.out_of_order, stats.resyncs, stats.duplicates), (0, 0, 0, 0))
+            self.assertEqual(stats.singles, 1)
+            self.assertAlmostEqual(stats.packet_error_rate(), 5.0)
+
+    def test_lost_frame_counted(self):
+        frames = pico_stream(10)
+        del frames[4]
+        station, readings = receive(frames)
+        self.assertEqual(len(readings), 10)
+        self.assertEqual(station.stats.lost, 1)
+
+    def test_single_copy_keeps_its_packet_status(self):
+        # Single copies released late are reported with the signal of their own frame, not the newest one
+        emulator = SX127xEmulator()
+        station = ByowsRpiStation(emulator=emulator, rx_timeout=0.2, dedup_hold=0.05)
+        self.addCleanup(station.close_radio)
+        signal = []
+        for header, rssi, crc_error in ((1, -50.0, False), (3, -100.0, False), (6, -110.0, True)):
+            emulator.inject(FRAME_STRUCT.pack(header, 24, 81, 880, 69, 66, 90, 1, 12, 128), rssi=rssi,
+                            crcError=crc_error)
+            data = station.get_data()
+            if data is not None:
+                signal.append(data["rxCheckPercent"])
+        # Reading 3 is held until it expires, the CRC failed frame after it doesn't release it
+        for _ in range(5):
+            if len(signal) == 2:
+                break
+            data = station.get_data()
+            if data is not None:
+                signal.append(data["rxCheckPercent"])
+        self.assertEqual(signal, [signal_percent(-50.0), signal_percent(-100.0)])
+
+    def account(self, headers):
+        stats = LinkStats()
+        for header in headers:
+            stats.frame(header, True, -60.0, 8.0)
+        return stats
+
+    def test_reordered_frame_not_lost(self):
+        # A late frame fills the gap counted when the newer header arrived, before and after the 255 -> 0 wrap
+        for headers in ((253, 254, 0, 255, 1), (254, 255, 1, 0, 2)):
+            stats = self.account(headers)
+            self.assertEqual((stats.lost, stats.out_of_order), (0, 1), headers)
+            self.assertEqual(stats.packet_error_rate(), 0.0)
+
+    def test_reordered_frame_with_real_loss(self):
+        # 254 and 1 are never received, 255 and 0 arrive late
+        stats = self.account((252, 253, 0, 255, 2))
+        self.assertEqual((stats.lost, stats.out_of_order), (2, 1))
+        stats = self.account((253, 1, 0, 255, 2))
+        self.assertEqual((stats.lost, stats.out_of_order), (1, 2))
+
+    def test_repeated_late_frame_counted_once(self):
+        stats = self.account((1, 2, 4, 3, 3))
+        self.assertEqual((stats.lost, stats.out_of_order), (0, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Merging of readings by PacketQueue and coalesce_data().
+
+Needs weewx to be importable, as the driver module is imported.
+
+Usage:
+    python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+try:
+    from user.LoRaRF.emulator import SX127xEmulator
+    from user.byows_rpi_lora import ByowsRpiStation, PacketQueue, coalesce_data
+except ImportError as exc:
+    raise unittest.SkipTest("driver not importable: %s" % exc)
+
+
+class CoalesceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.station = ByowsRpiStation(emulator=SX127xEmulator())
+
+    def tearDown(self):
+        self.station.close_radio()
+
+    def reading(self, wind_count, interval, outTemp=20.0):
+        """ Wind and rain fields as get_data() builds them from the Pico's counts. """
+        return {"outTemp": outTemp,
+                "windSpeed": self.station.get_wind_speed(wind_count, interval),
+                "anemRotations": wind_count / 2.0,
+                "timeAnemInterval": interval,
+                "rain": 0.2794}
+
+    def assertConsistentWind(self, data):
+        # The speed of the merged packet matches its own rotation count and interval
+        expected = self.station.calculate_speed(data["timeAnemInterval"], data["anemRotations"] * 2)
+        self.assertAlmostEqual(data["windSpeed"], expected)
+
+    def test_coalesce_recomputes_wind_speed(self):
+        data = coalesce_data(self.reading(12, 5.0), self.reading(2, 15.0, 21.0), PacketQueue.ACCUMULATED_FIELDS)
+        self.assertEqual(data["anemRotations"], 7.0)
+        self.assertEqual(data["timeAnemInterval"], 20.0)
+        self.assertAlmostEqual(data["rain"], 0.5588)
+        self.assertEqual(data["outTemp"], 21.0)
+        self.assertConsistentWind(data)
+
+    def test_coalesce_without_interval(self):
+        older = self.reading(12, 0.0)
+        newer = self.reading(2, 0.0)
+        data = coalesce_data(older, newer, PacketQueue.ACCUMULATED_FIELDS)
+        self.assertEqual(data["windSpeed"], 0.0)
+
+    def test_queue_overflow_coalesces(self):
+        queue = PacketQueue(2, PacketQueue.COALESCE)
+        for wind_count, interval in ((4, 5.0), (12, 5.0), (2, 10.0), (30, 5.0)):
+            queue.put(self.reading(wind_count, interval))
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(queue.coalesced, 2)
+        self.assertConsistentWind(queue.get())
+        merged = queue.get()
+        self.assertEqual(merged["anemRotations"], 22.0)
+        self.assertEqual(merged["timeAnemInterval"], 20.0)
+        self.assertConsistentWind(merged)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Radio session handling of ByowsRpiStation, run against the in-process SX127x emulator with DIO0 wired.
+
+Needs weewx to be importable, as the driver module is imported.
+
+Usage:
+    python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+try:
+    from user.LoRaRF.emulator import SX127xEmulator
+    from user.byows_rpi_lora import ByowsRpiStation, FRAME_STRUCT
+except ImportError as exc:
+    raise unittest.SkipTest("driver not importable: %s" % exc)
+
+
+def monitor_threads():
+    """ Number of running LoRaIrq monitor threads. """
+    return sum(thread.name.endswith("(_run)") for thread in threading.enumerate())
+
+
+class RadioSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = SX127xEmulator()
+        self.station = ByowsRpiStation(emulator=self.emulator, irq_pin=17, rx_timeout=1.0)
+        self.threads = monitor_threads()
+
+    def tearDown(self):
+        self.station.close_radio()
+
+    def receive_pair(self, header):
+        readings = 0
+        for copy in (header, header + 1):
+            self.emulator.inject(FRAME_STRUCT.pack(copy, 24, 81, 880, 69, 66, 90, 1, 12, 128))
+            readings += self.station.get_data() is not None
+        return readings
+
+    def test_dropped_session_ends_interrupt_monitor(self):
+        self.assertEqual(self.receive_pair(1), 1)
+        # Radio stops answering: check_radio() drops the session, the next reading re-initialises it
+        self.emulator.registers[self.emulator.REG_VERSION] = 0
+        self.assertFalse(self.station.check_radio())
+        self.assertEqual(monitor_threads(), self.threads)
+        self.assertEqual(self.receive_pair(3) + self.receive_pair(5), 2)
+        self.assertEqual(self.station.stats.lost, 0)
+        self.assertEqual(self.station.stats.singles, 0)
+        self.assertEqual(monitor_threads(), self.threads + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
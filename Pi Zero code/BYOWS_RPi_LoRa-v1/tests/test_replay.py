@@ -0,0 +1,67 @@
+"""
+Loop packets of the ByowsRpi driver replaying a recorded trace instead of using the radio.
+
+Needs weewx to be importable, as the driver module is imported.
+
+Usage:
+    python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+
+try:
+    from user.LoRaRF import TraceWriter
+    from user.byows_rpi_lora import ByowsRpi, FRAME_INTERVAL_STRUCT
+except ImportError as exc:
+    raise unittest.SkipTest("driver not importable: %s" % exc)
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".trace")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        # Four readings sent twice each, with 12, 2, 30 and 4 wind counts over 5 seconds
+        with TraceWriter(self.path) as trace:
+            for reading, wind_count in enumerate((12, 2, 30, 4)):
+                for copy in (1, 2):
+                    frame = FRAME_INTERVAL_STRUCT.pack(reading * 2 + copy, 24, 81, 880, 69, 66, 90, 1, wind_count,
+                                                       128, 5000)
+                    trace.write(frame, -60.0, 8.0, 0x40, timestamp=1000.0 + reading * 5)
+
+    def packets(self, **options):
+        driver = ByowsRpi(replay_file=self.path, replay_speed="fast", **options)
+        self.addCleanup(driver.closePort)
+        packets = []
+        # genLoopPackets must end by itself once the trace ran out
+        thread = threading.Thread(target=lambda: packets.extend(driver.genLoopPackets()), daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive(), "genLoopPackets did not end with the trace")
+        return driver, packets
+
+    def test_loop_ends_with_trace(self):
+        driver, packets = self.packets()
+        self.assertEqual(len(packets), 4)
+        self.assertEqual([packet["anemRotations"] for packet in packets], [6.0, 1.0, 15.0, 2.0])
+
+    def test_loop_interval_coalesces_until_trace_ends(self):
+        driver, packets = self.packets(loop_interval=3600)
+        # The first reading is yielded at once, the others are merged into the last packet
+        self.assertEqual(len(packets), 2)
+        merged = packets[1]
+        self.assertEqual(merged["anemRotations"], 18.0)
+        self.assertEqual(merged["timeAnemInterval"], 15.0)
+        expected = driver.station.calculate_speed(merged["timeAnemInterval"], merged["anemRotations"] * 2)
+        self.assertAlmostEqual(merged["windSpeed"], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -214,6 +214,8 @@ class BME280:
         # sign = lambda a: 1 if a > 0 else -1 if a < 0 else 0  # Getting the sign of original number
         def sign(a): return 1 if a > 0 else -1 if a < 0 else 0  # Getting the sign of original number
         ti = ti * sign(t)  # Assigning the sign of the original number
+        if ti == 0 and t < 0:
+            td = -td  # The integer part can't carry the sign between 0 and -1, so the decimal carries it
 
         # Original script - Use the below return if you want the data to be returned as a string
         # return ("{}C".format(t / 100), "{}.{:02d}hPa".format(pi, pd),
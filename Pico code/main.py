@@ -84,6 +84,7 @@ led = Pin("LED", Pin.OUT)
 # Global count variables
 windCount = 0
 rainCount = 0
+countStart = utime.ticks_ms()  # Start of the current counting interval, sent so the receiver can compute speeds
 
 # Wind Vane
 windVane = ADC(Pin(26))  # Assign the Wind Vane to ADC0 (Pin 26)
@@ -181,7 +182,7 @@ try:
         [(1)packet header#,    (2)byte_array, (3)temp_d1,      (4)byte_array, (5)temp_d2,  
         (6)byte_array, (7)pressure_d1,      (8)byte_array, (9)pressure_d2,      (10)byte_array, (11)humidity_d1, 
         (12)byte_array, (13)humidity_d2,    (14)rainfall(bucket tips),          (15)windcount (Anemometer rotations), 
-        (16)windDir (Wind vane) ]
+        (16)windDir (Wind vane),    (17)(18)interval (milliseconds the rain and wind were counted over) ]
         
         Integer is 32 bits (4*8 bits array), so I should really be using 4 array ([1,2,3,4]) for the int values 
         instead of 2 array ([1,2]). But the numbers I use aren't going to be very large, so to save on memory and 
@@ -215,7 +216,16 @@ try:
         # Passing 1 byte is enough as the number won't get > 255 in 2.5 sec loop
         winddir = windDir.to_bytes(1, 'big')
 
-        reading = [temp_d1, temp_d2, pressure_d1, pressure_d2, humidity_d1, humidity_d2, rainfall, windcount, winddir]
+        # Counting interval
+        # The rain and wind counts cover the time since the previous reset. Sending it lets the receiver compute
+        # the wind speed over the window that was actually counted, however late it processes the frame.
+        # 2 bytes hold up to 65.5 sec, which is plenty for the 5 sec loop
+        now = utime.ticks_ms()
+        interval = min(utime.ticks_diff(now, countStart), 65535).to_bytes(2, 'big')
+        countStart = now
+
+        reading = [temp_d1, temp_d2, pressure_d1, pressure_d2, humidity_d1, humidity_d2, rainfall, windcount, winddir,
+                   interval]
 
         """
         Readings are sent twice as sometimes junk readings are received on the receiver side. We compare the two
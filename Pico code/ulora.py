@@ -282,7 +282,7 @@ class LoRa(object):
         return True
 
     def send_to_wait(self, data, header_to, header_flags=0, retries=0):
-        self._last_header_id += 1
+        self._last_header_id = (self._last_header_id + 1) & 0xFF  # The header is a single byte, wrap after 255
 
         for _ in range(retries + 1):
             self.send(data, header_to, header_id=self._last_header_id, header_flags=header_flags)